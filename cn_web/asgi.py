@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cn_web.settings')
 
 application = get_asgi_application()
+
+# Import after django setup: live standings are streamed outside of django
+# request cycle, that can't stream asynchronously.
+from codenames.events import with_results_events  # noqa: E402
+
+application = with_results_events(application)
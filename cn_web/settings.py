@@ -52,14 +52,38 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'codenames.metrics.SQLMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'codenames.profiling.ProfilingMiddleware',
+    'codenames.timing.ServerTimingMiddleware',
 ]
 
+# Cache shared by all workers, so standings of every group are rendered
+# once (see codenames.standings). Table is created by "createcachetable"
+# on release.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_TABLE", "codenames_cache"),
+    }
+}
+
+# Server-Timing header with standings stages, see codenames.timing
+SERVER_TIMING = os.environ.get("DJANGO_SERVER_TIMING", "") == "True"
+# SQL metrics of views on /metrics/, see codenames.metrics
+SQL_METRICS = os.environ.get("DJANGO_SQL_METRICS", "") == "True"
+SQL_METRICS_SLOW_REQUEST_MS = int(
+    os.environ.get("DJANGO_SQL_METRICS_SLOW_REQUEST_MS", "500"))
+# Bearer token of metrics scraper, staff users need none
+SQL_METRICS_TOKEN = os.environ.get("DJANGO_SQL_METRICS_TOKEN")
+# Folder for .prof files of ?profile=cpu&save=1, see codenames.profiling
+PROFILE_DIR = os.environ.get("DJANGO_PROFILE_DIR")
+
 ROOT_URLCONF = 'cn_web.urls'
 
 TEMPLATES = [
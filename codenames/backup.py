@@ -0,0 +1,217 @@
+"""
+Backup and restore of game results of cup or group.
+
+Backup is line-delimited: JSON lines or CSV rows,
+the first line is header with schema version and fields.
+Both directions stream rows in chunks, so memory doesn't depend
+on number of games.
+"""
+
+import csv
+import json
+import typing as tp
+
+from django.db import transaction
+from django.db.models import QuerySet, Value
+from django.db.models.functions import Coalesce
+
+from .models import GameResult, Group
+from .models import bump_results_version, get_result_columns
+from .models import result_types_registry
+
+BACKUP_SCHEMA_VERSION: int = 1
+BACKUP_MODEL: str = "codenames.gameresult"
+BACKUP_FORMATS: tp.List[str] = ["jsonl", "csv"]
+
+# Result type is stored by abbr, ids differ between databases
+BACKUP_FIELDS: tp.List[str] = [
+    "id",
+    "group_id",
+    "home_team_id",
+    "away_team_id",
+    "round_number",
+    "arena_id",
+    "result_abbr",
+    "score",
+    "home_team_fouls",
+    "away_team_fouls",
+]
+# Fields identifying game, restore checks them and doesn't change them
+BACKUP_KEY_FIELDS: tp.List[str] = [
+    "id", "group_id", "home_team_id", "away_team_id",
+]
+RESTORED_FIELDS: tp.List[str] = [
+    "round_number",
+    "arena",
+    "result_type",
+    "score",
+    "home_team_fouls",
+    "away_team_fouls",
+    "winner_side",
+    "effective_score",
+    "finished",
+    "result_abbr",
+]
+
+CHUNK_SIZE: int = 1000
+
+BackupRow = tp.Dict[str, tp.Any]
+
+
+class BackupError(Exception):
+    """
+    Backup can't be restored.
+    """
+
+
+def write_backup(games: "QuerySet[GameResult]",
+                 dst: tp.TextIO,
+                 *,
+                 backup_format: str = "jsonl",
+                 chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    :return: number of written games
+    """
+    # Abbr is taken from result type itself, not from derived column,
+    # so that backup of game with drifted columns is right
+    rows = games.order_by("id").annotate(
+        backup_result_abbr=Coalesce("result_type__abbr", Value(""))
+    ).values_list(*[
+        "backup_result_abbr" if name == "result_abbr" else name
+        for name in BACKUP_FIELDS
+    ]).iterator(chunk_size=chunk_size)
+    num_games: int = 0
+    if backup_format == "jsonl":
+        dst.write(json.dumps({"schema_version": BACKUP_SCHEMA_VERSION,
+                              "model": BACKUP_MODEL,
+                              "fields": BACKUP_FIELDS}) + "\n")
+        for row in rows:
+            dst.write(json.dumps(row, separators=(",", ":")) + "\n")
+            num_games += 1
+    elif backup_format == "csv":
+        writer = csv.writer(dst)
+        writer.writerow([BACKUP_MODEL, BACKUP_SCHEMA_VERSION])
+        writer.writerow(BACKUP_FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            num_games += 1
+    else:
+        raise ValueError(f"Unknown backup format {backup_format}")
+    return num_games
+
+
+def check_header(model: str, schema_version: tp.Any) -> None:
+    if model != BACKUP_MODEL:
+        raise BackupError(f"Backup of {model}, not of {BACKUP_MODEL}")
+    if str(schema_version) != str(BACKUP_SCHEMA_VERSION):
+        raise BackupError(f"Backup schema version {schema_version} "
+                          f"is not {BACKUP_SCHEMA_VERSION}")
+
+
+def read_backup(src: tp.TextIO) -> tp.Iterator[BackupRow]:
+    """
+    Rows of JSON lines or CSV backup, format is detected by header.
+    :raises BackupError: if header or some row is malformed
+    """
+    first_line = src.readline()
+    if not first_line.strip():
+        raise BackupError("Backup is empty")
+    try:
+        if first_line.startswith("{"):
+            header = json.loads(first_line)
+            check_header(header.get("model"), header.get("schema_version"))
+            fields = header["fields"]
+            rows = (json.loads(line) for line in src if line.strip())
+        else:
+            reader = csv.reader(src)
+            check_header(*next(csv.reader([first_line])))
+            fields = next(reader)
+            rows = reader
+        wrong_fields: bool = set(fields) != set(BACKUP_FIELDS)
+    except (csv.Error, AttributeError, KeyError, StopIteration, TypeError,
+            ValueError) as wrong_header:
+        raise BackupError(
+            f"Wrong backup header: {wrong_header!r}") from wrong_header
+    if wrong_fields:
+        raise BackupError(f"Backup fields {fields} are not {BACKUP_FIELDS}")
+
+    num_rows: int = 0
+    try:
+        for values in rows:
+            row = dict(zip(fields, values))
+            for name in BACKUP_FIELDS:
+                if name != "result_abbr":
+                    row[name] = int(row[name])
+            num_rows += 1
+            yield row
+    except (csv.Error, KeyError, TypeError, ValueError) as wrong_row:
+        raise BackupError(f"Wrong backup row {num_rows + 1}: "
+                          f"{wrong_row!r}") from wrong_row
+
+
+def restore_games(games: "QuerySet[GameResult]",
+                  rows: tp.Iterable[BackupRow],
+                  *,
+                  batch_size: int = CHUNK_SIZE) -> tp.Tuple[int, int]:
+    """
+    Update games from backup rows in one transaction,
+    only games of queryset are restored, other rows are skipped,
+    so group can be restored from backup of whole cup.
+    :return: tuple (number of restored games, number of skipped rows)
+    :raises BackupError: if game has other group or teams than in backup
+    :raises ResultType.DoesNotExist: if backup has unknown result type
+    """
+    num_games: int = 0
+    num_rows: int = 0
+    with transaction.atomic():
+        batch: tp.List[BackupRow] = []
+        for row in rows:
+            batch.append(row)
+            num_rows += 1
+            if len(batch) == batch_size:
+                num_games += restore_batch(games, batch)
+                batch = []
+        if batch:
+            num_games += restore_batch(games, batch)
+        # bulk_update sends no signals
+        bump_results_version(Group.objects.filter(
+            id__in=games.values("group_id")))
+    return num_games, num_rows - num_games
+
+
+def restore_batch(games: "QuerySet[GameResult]",
+                  batch: tp.List[BackupRow]) -> int:
+    """
+    :return: number of restored games, rows out of games are skipped
+    """
+    existing_keys: tp.Dict[int, tp.Tuple[int, ...]] = {
+        key[0]: key
+        for key in games.filter(
+            id__in=[row["id"] for row in batch]
+        ).values_list(*BACKUP_KEY_FIELDS)
+    }
+    restored_games: tp.List[GameResult] = []
+    for row in batch:
+        if row["id"] not in existing_keys:
+            continue
+        key = tuple(row[name] for name in BACKUP_KEY_FIELDS)
+        if existing_keys[row["id"]] != key:
+            raise BackupError(f"Game {row['id']} of backup "
+                              f"has other group or teams")
+        result_type = (result_types_registry.get_by_abbr(row["result_abbr"])
+                       if row["result_abbr"] else None)
+        # Key fields are given, so dummy defaults are not queried
+        restored_games.append(GameResult(
+            id=row["id"],
+            group_id=row["group_id"],
+            home_team_id=row["home_team_id"],
+            away_team_id=row["away_team_id"],
+            round_number=row["round_number"],
+            arena_id=row["arena_id"],
+            result_type=result_type,
+            score=row["score"],
+            home_team_fouls=row["home_team_fouls"],
+            away_team_fouls=row["away_team_fouls"],
+            **get_result_columns(result_type, row["score"])))
+    GameResult.objects.bulk_update(restored_games, RESTORED_FIELDS)
+    return len(restored_games)
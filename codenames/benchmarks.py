@@ -0,0 +1,253 @@
+"""
+Benchmarks of standings on synthetic tournaments.
+
+Every scenario generates a cup (see synthetic), measures median wall
+time and SQL queries of standings stages and rolls the cup back.
+Results are saved as JSON, so comparing with saved baseline
+(or just diffing it) shows regressions.
+"""
+
+import json
+import statistics
+import time
+import typing as tp
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .loader import load_groups
+from .models import Arena, Cup, GameResult, Group, Team
+from .models import GroupResultsVersion
+from .models import result_types_registry
+from .result_matrix import ResultMatrix
+from .synthetic import generate_cup
+from .table_render import calculate_places, get_row
+from .table_render import get_recent_games_schedule
+from .table_render import get_upcoming_games_schedule
+from .table_render import render_result_table_content
+from .tiebreak import count_base_tie_breakers
+from .tiebreak import count_teams_base_tie_breakers
+from .views import all_groups_tables_view
+
+BENCHMARK_CUP_NUMBER: int = 1
+
+# Scenario name -> arguments of synthetic.generate_cup
+BENCHMARK_SCENARIOS: tp.Dict[str, tp.Dict[str, tp.Any]] = {
+    "small_half": {
+        "num_groups": 2, "num_teams": 6, "completion": 0.5,
+    },
+    "cup_full": {
+        "num_groups": 4, "num_teams": 10, "completion": 1.0,
+    },
+    "cup_ties": {
+        "num_groups": 4, "num_teams": 10, "completion": 1.0,
+        "tie_heavy": True,
+    },
+    "large_ties": {
+        "num_groups": 8, "num_teams": 10, "completion": 0.8,
+        "tie_heavy": True,
+    },
+}
+
+# Benchmark name -> {"time_ms": median time, "queries": number of queries}
+ScenarioResults = tp.Dict[str, tp.Dict[str, tp.Union[float, int]]]
+
+
+def measure(func: tp.Callable[[], tp.Any],
+            repeat: int,
+            *,
+            setup: tp.Callable[[], tp.Any] = None) -> tp.Dict[str, tp.Any]:
+    """
+    Median wall time of func and number of its queries.
+    :param setup: called before every run out of measurement
+    """
+    times: tp.List[float] = []
+    num_queries: int = 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        num_queries = len(queries)
+    return {
+        "time_ms": round(statistics.median(times) * 1000, 3),
+        "queries": num_queries,
+    }
+
+
+def run_scenario(scenario: tp.Dict[str, tp.Any],
+                 repeat: int,
+                 seed: int = 0) -> ScenarioResults:
+    """
+    Generate cup of scenario, benchmark standings on it and roll back.
+    """
+    with transaction.atomic():
+        cup = generate_cup(BENCHMARK_CUP_NUMBER, seed=seed, **scenario)
+        groups = list(Group.objects.filter(cup=cup, dummy=False)
+                      .select_related("results_version"))
+        groups_data = load_groups(cup, groups)
+
+        def render_tables():
+            for group_data in groups_data:
+                render_result_table_content(group_data, do_sort=True)
+
+        unsorted_tables = []
+        for group_data in groups_data:
+            num_teams = len(group_data.teams)
+            result_matrix = ResultMatrix.from_games(num_teams,
+                                                    group_data.games)
+            table = [
+                get_row(team_seed, team, num_teams,
+                        home_games=[], away_games=[],
+                        tie_breakers=count_base_tie_breakers(result_matrix,
+                                                             team_seed))
+                for team_seed, team in sorted(
+                    group_data.teams_by_seed.items())
+            ]
+            unsorted_tables.append((result_matrix, table))
+
+        def calculate_tables_places():
+            for result_matrix, table in unsorted_tables:
+                calculate_places(result_matrix, list(table))
+
+        def count_tie_breakers_in_db():
+            count_teams_base_tie_breakers(
+                GameResult.objects.filter(group__in=groups))
+
+        def get_schedules():
+            for group_data in groups_data:
+                get_upcoming_games_schedule(group_data)
+                get_recent_games_schedule(group_data)
+
+        request = RequestFactory().get("/results/")
+
+        def get_view():
+            all_groups_tables_view(request,
+                                   cup_number=cup.number,
+                                   do_sort=True)
+
+        results: ScenarioResults = {
+            "load_groups": measure(lambda: load_groups(cup, groups),
+                                   repeat),
+            "render_result_table_content": measure(render_tables, repeat),
+            "calculate_places": measure(calculate_tables_places, repeat),
+            "count_teams_base_tie_breakers": measure(
+                count_tie_breakers_in_db, repeat),
+            "schedules": measure(get_schedules, repeat),
+            "all_groups_tables_view_cold": measure(get_view, repeat,
+                                                   setup=cache.clear),
+            "all_groups_tables_view_warm": measure(get_view, repeat),
+        }
+        transaction.set_rollback(True)
+    cache.clear()
+    return results
+
+
+# Cups of dataset to explain access paths on
+EXPLAIN_SCENARIO: tp.Dict[str, tp.Any] = {
+    "num_groups": 4, "num_teams": 10, "completion": 0.7,
+}
+EXPLAIN_CUPS_NUMBER: int = 20
+
+
+def get_access_paths(cup: Cup) -> tp.Dict[str, QuerySet]:
+    """
+    Queries standings code makes, by the code making them.
+    """
+    groups = Group.objects.filter(cup=cup, dummy=False)
+    group = groups.order_by("name")[0]
+    return {
+        # views.all_groups_tables_view
+        "groups_of_cup": groups.select_related("results_version"),
+        # views.one_group_table_view and its etag
+        "group_by_cup_and_name": Group.objects.filter(
+            cup__number=cup.number, name=group.name).select_related(
+                "results_version"),
+        # loader.load_groups
+        "teams_of_groups": Team.objects.filter(group__in=groups),
+        "arenas_of_groups": Arena.objects.filter(group__in=groups),
+        "games_of_groups": GameResult.objects.filter(
+            group__in=groups).order_by("id"),
+        # standings.lock_results_versions
+        "results_versions_of_groups": GroupResultsVersion.objects.filter(
+            group__in=groups).order_by("group_id"),
+        # views.get_games_choices
+        "games_by_group_name": GameResult.objects.filter(
+            group__name=group.name, group__cup__number=cup.number),
+        # models.update_result_type_games
+        "games_by_result_type": GameResult.objects.filter(
+            result_type=result_types_registry.get_by_abbr("W1")),
+    }
+
+
+def run_explain(repeat: int,
+                num_cups: int = EXPLAIN_CUPS_NUMBER,
+                seed: int = 0) -> tp.Dict[str, tp.Dict[str, tp.Any]]:
+    """
+    Generate num_cups cups, get plan and median time of every access path
+    in the last cup and roll back.
+    :return: dict {access path: {"plan": plan, "time_ms": median time}}
+    """
+    with transaction.atomic():
+        for cup_number in range(1, num_cups + 1):
+            cup = generate_cup(cup_number, seed=seed + cup_number,
+                               **EXPLAIN_SCENARIO)
+        results = {}
+        for name, queryset in get_access_paths(cup).items():
+            results[name] = {
+                "plan": queryset.explain(),
+                "time_ms": measure(lambda: list(queryset.all()),
+                                   repeat)["time_ms"],
+            }
+        transaction.set_rollback(True)
+    return results
+
+
+def save_results(results: tp.Dict[str, ScenarioResults], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as json_dst:
+        json.dump(results, json_dst, indent=4, sort_keys=True)
+        json_dst.write("\n")
+
+
+def load_results(path: str) -> tp.Dict[str, ScenarioResults]:
+    with open(path, "r", encoding="utf-8") as json_src:
+        return json.load(json_src)
+
+
+def compare_results(
+        results: tp.Dict[str, ScenarioResults],
+        baseline: tp.Dict[str, ScenarioResults],
+        time_tolerance: float) -> tp.Tuple[tp.List[str], tp.List[str]]:
+    """
+    :param time_tolerance: allowed ratio of time to baseline time
+    :return: tuple (report lines, regressions)
+    """
+    lines: tp.List[str] = []
+    regressions: tp.List[str] = []
+    for scenario_name, scenario_results in results.items():
+        for name, result in scenario_results.items():
+            full_name = f"{scenario_name}.{name}"
+            base = baseline.get(scenario_name, {}).get(name)
+            if base is None:
+                lines.append(f"{full_name}: no baseline")
+                continue
+            ratio = (result["time_ms"] / base["time_ms"]
+                     if base["time_ms"] else 1.0)
+            lines.append(
+                f"{full_name}: "
+                f"{base['time_ms']:.3f} -> {result['time_ms']:.3f} ms "
+                f"(x{ratio:.2f}), "
+                f"{base['queries']} -> {result['queries']} queries")
+            if result["queries"] > base["queries"]:
+                regressions.append(
+                    f"{full_name}: {result['queries']} queries "
+                    f"instead of {base['queries']}")
+            if ratio > time_tolerance:
+                regressions.append(
+                    f"{full_name}: {ratio:.2f} times slower")
+    return lines, regressions
@@ -49,6 +49,15 @@ def get_score_str(score: int) -> str:
 HOME_TEAM_WORDS_NUMBER: int = 9
 AWAY_TEAM_WORDS_NUMBER: int = 8
 
+HOME_SIDE: str = "H"
+AWAY_SIDE: str = "A"
+
+WINNER_SIDE_CHOICES: tp.List[tp.Tuple[str, str]] = [
+    ("", "---"),
+    (HOME_SIDE, "Home"),
+    (AWAY_SIDE, "Away"),
+]
+
 SCORE_CHOICES = [(score, get_score_str(score))
                  for score in range(-HOME_TEAM_WORDS_NUMBER,
                                     AWAY_TEAM_WORDS_NUMBER + 1)]
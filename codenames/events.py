@@ -0,0 +1,348 @@
+"""
+Server-Sent Events with live standings.
+
+Client subscribes to groups of a cup and tells results versions it has
+(by "versions" query parameter, then by Last-Event-ID on reconnect).
+Every event carries re-rendered standings fragment of one changed group.
+
+Under ASGI events are streamed by results_events_application
+through one long-lived connection. Connections don't query database
+while nothing changes: results_versions_poller reads versions of all
+subscribed cups once per RESULTS_EVENTS_POLL_INTERVAL for the whole
+process and wakes up connections of changed cups.
+Under WSGI results_events_view answers once and client reconnects
+after RESULTS_EVENTS_RETRY.
+"""
+
+import asyncio
+import collections
+import json
+import typing as tp
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import QueryDict
+from django.urls import Resolver404, resolve, reverse
+
+from .consts import CURRENT_CUP_NUMBER
+from .models import Group
+from .models import get_results_version
+from .standings import get_groups_standings
+
+# Seconds between checks of results versions of subscribed cups
+RESULTS_EVENTS_POLL_INTERVAL: float = 0.5
+# Seconds between keepalive comments of idle connection
+RESULTS_EVENTS_KEEPALIVE: float = 15
+# Milliseconds before client reconnects
+RESULTS_EVENTS_RETRY: int = 10000
+
+RESULTS_EVENTS_URL_NAME = "codenames:results_events"
+
+Versions = tp.Dict[str, int]
+
+VERSIONS_DELIMITER = ","
+GROUP_VERSION_DELIMITER = ":"
+
+
+def parse_versions(versions_string: tp.Optional[str]) -> Versions:
+    """
+    "A:3,B:5" -> {"A": 3, "B": 5}, invalid items are skipped
+    """
+    versions: Versions = {}
+    if not versions_string:
+        return versions
+    for item in versions_string.split(VERSIONS_DELIMITER):
+        group_name, _, version = item.partition(GROUP_VERSION_DELIMITER)
+        try:
+            versions[group_name] = int(version)
+        except ValueError:
+            continue
+    return versions
+
+
+def format_versions(versions: Versions) -> str:
+    return VERSIONS_DELIMITER.join(
+        f"{group_name}{GROUP_VERSION_DELIMITER}{version}"
+        for group_name, version in sorted(versions.items())
+    )
+
+
+def get_groups_versions(groups: tp.List[Group]) -> Versions:
+    """
+    Groups should be fetched with select_related("results_version").
+    """
+    return {group.name: get_results_version(group) for group in groups}
+
+
+def format_event(data: str, *, event: str = None, id_: str = None) -> str:
+    lines: tp.List[str] = []
+    if event is not None:
+        lines.append(f"event: {event}")
+    if id_ is not None:
+        lines.append(f"id: {id_}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+class ResultsEventsParams:
+    """
+    What client is subscribed to and what it already has.
+    """
+
+    def __init__(self, query: QueryDict, last_event_id: tp.Optional[str]):
+        try:
+            self.cup_number: int = int(query.get("cup", CURRENT_CUP_NUMBER))
+        except ValueError:
+            self.cup_number = CURRENT_CUP_NUMBER
+        self.group_names: tp.List[str] = [
+            group_name.upper() for group_name in query.getlist("group")
+        ]
+        self.do_sort: bool = query.get("sorted", "1") != "0"
+        self.versions: Versions = parse_versions(
+            last_event_id or query.get("versions"))
+
+    def get_groups(self) -> tp.List[Group]:
+        groups = Group.objects.filter(
+            cup__number=self.cup_number
+        ).select_related("cup", "results_version")
+        if self.group_names:
+            groups = groups.filter(name__in=self.group_names)
+        else:
+            groups = groups.filter(dummy=False)
+        return list(groups)
+
+
+def get_results_events_url(cup_number: int,
+                           groups: tp.List[Group],
+                           do_sort: bool,
+                           *,
+                           group_names: tp.List[str] = None) -> str:
+    """
+    URL to subscribe to groups results since their current versions.
+    Groups should be fetched with select_related("results_version").
+    """
+    query = QueryDict(mutable=True)
+    query["cup"] = cup_number
+    if group_names:
+        query.setlist("group", group_names)
+    query["sorted"] = int(do_sort)
+    query["versions"] = format_versions(get_groups_versions(groups))
+    return f"{reverse(RESULTS_EVENTS_URL_NAME)}?{query.urlencode()}"
+
+
+def collect_results_events(
+        params: ResultsEventsParams,
+        versions: Versions) -> tp.Tuple[str, Versions]:
+    """
+    Render events for groups whose results changed since versions.
+    :return: tuple (events, new versions)
+    """
+    groups = params.get_groups()
+    new_versions = get_groups_versions(groups)
+    changed_groups = [
+        group for group in groups
+        if versions.get(group.name) != new_versions[group.name]
+    ]
+    if not changed_groups:
+        return "", new_versions
+
+    groups_standings = get_groups_standings(changed_groups[0].cup,
+                                            changed_groups,
+                                            params.do_sort)
+    events_id = format_versions(new_versions)
+    events = "".join(
+        format_event(
+            json.dumps({
+                "group": group.name,
+                "html": groups_standings[group.name],
+            }),
+            event="group",
+            id_=events_id)
+        for group in changed_groups
+    )
+    return events, new_versions
+
+
+def poll_results_events(
+        params: ResultsEventsParams,
+        versions: Versions) -> tp.Tuple[str, Versions]:
+    # Long-lived connection gets no request_started/finished signals
+    close_old_connections()
+    return collect_results_events(params, versions)
+
+
+def read_cups_versions(cups_numbers: tp.List[int]) -> tp.Dict[int, Versions]:
+    """
+    Results versions of all groups of cups in one query.
+    """
+    close_old_connections()
+    cups_versions: tp.Dict[int, Versions] = {
+        cup_number: {} for cup_number in cups_numbers}
+    for cup_number, group_name, version in Group.objects.filter(
+            cup__number__in=cups_numbers, dummy=False
+    ).values_list("cup__number", "name", "results_version__version"):
+        cups_versions[cup_number][group_name] = version or 0
+    return cups_versions
+
+
+class ResultsVersionsPoller:
+    """
+    Reads results versions of subscribed cups for all connections
+    of process and wakes up connections of cups whose versions changed.
+    Runs only while there are subscribed connections.
+    """
+
+    def __init__(self):
+        self._reset(None)
+
+    def _reset(self, loop: tp.Optional[asyncio.AbstractEventLoop]) -> None:
+        self._loop: tp.Optional[asyncio.AbstractEventLoop] = loop
+        self._task: tp.Optional[asyncio.Future] = None
+        # Cup number -> number of subscribed connections
+        self.subscribers: tp.Counter[int] = collections.Counter()
+        # Cup number -> versions of groups by last read
+        self.versions: tp.Dict[int, Versions] = {}
+        # Cup number -> event set on next change of versions
+        self._changed: tp.Dict[int, asyncio.Event] = {}
+
+    def subscribe(self, cup_number: int) -> None:
+        loop = asyncio.get_event_loop()
+        if loop is not self._loop:
+            # State of other (e.g. closed) event loop can't be awaited
+            self._reset(loop)
+        self.subscribers[cup_number] += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+
+    def unsubscribe(self, cup_number: int) -> None:
+        self.subscribers[cup_number] -= 1
+        if self.subscribers[cup_number] <= 0:
+            del self.subscribers[cup_number]
+            self.versions.pop(cup_number, None)
+            self._changed.pop(cup_number, None)
+
+    def get_changed_event(self, cup_number: int) -> asyncio.Event:
+        if cup_number not in self._changed:
+            self._changed[cup_number] = asyncio.Event()
+        return self._changed[cup_number]
+
+    def has_changes(self, params: ResultsEventsParams,
+                    versions: Versions) -> bool:
+        """
+        Whether some group of params has other version by last read.
+        """
+        return any(
+            versions.get(group_name) != version
+            for group_name, version in self.versions.get(
+                params.cup_number, {}).items()
+            if not params.group_names or group_name in params.group_names
+        )
+
+    async def poll(self) -> None:
+        cups_versions = await sync_to_async(read_cups_versions)(
+            list(self.subscribers))
+        for cup_number, versions in cups_versions.items():
+            if cup_number not in self.subscribers:
+                continue
+            if self.versions.get(cup_number) != versions:
+                self.versions[cup_number] = versions
+                changed = self._changed.pop(cup_number, None)
+                if changed is not None:
+                    changed.set()
+
+    async def run(self) -> None:
+        while self.subscribers:
+            await self.poll()
+            await asyncio.sleep(RESULTS_EVENTS_POLL_INTERVAL)
+
+
+results_versions_poller = ResultsVersionsPoller()
+
+
+async def wait_for_disconnect(receive) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def send_text(send, text: str) -> None:
+    await send({
+        "type": "http.response.body",
+        "body": text.encode("utf-8"),
+        "more_body": True,
+    })
+
+
+async def results_events_application(scope, receive, send) -> None:
+    """
+    ASGI application streaming results events until client disconnects.
+    """
+    headers = dict(scope["headers"])
+    last_event_id = headers.get(b"last-event-id", b"").decode("latin-1")
+    params = ResultsEventsParams(
+        QueryDict(scope["query_string"].decode("latin-1")),
+        last_event_id or None)
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+    await send_text(send, f"retry: {RESULTS_EVENTS_RETRY}\n\n")
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    results_versions_poller.subscribe(params.cup_number)
+    try:
+        # Client may be behind already
+        events, versions = await sync_to_async(poll_results_events)(
+            params, params.versions)
+        if events:
+            await send_text(send, events)
+        while not disconnected.done():
+            changed = asyncio.ensure_future(
+                results_versions_poller.get_changed_event(
+                    params.cup_number).wait())
+            done, _ = await asyncio.wait(
+                [disconnected, changed],
+                timeout=RESULTS_EVENTS_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED)
+            changed.cancel()
+            if disconnected in done:
+                break
+            if changed not in done:
+                await send_text(send, ": keepalive\n\n")
+                continue
+            if not results_versions_poller.has_changes(params, versions):
+                continue
+            events, versions = await sync_to_async(poll_results_events)(
+                params, versions)
+            if events:
+                await send_text(send, events)
+    finally:
+        results_versions_poller.unsubscribe(params.cup_number)
+        disconnected.cancel()
+
+
+def is_results_events_path(path: str) -> bool:
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return False
+    return match.view_name == RESULTS_EVENTS_URL_NAME
+
+
+def with_results_events(application):
+    """
+    Wrap django ASGI application to stream results events itself.
+    """
+    async def results_events_router(scope, receive, send):
+        if scope["type"] == "http" and is_results_events_path(scope["path"]):
+            await results_events_application(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+    return results_events_router
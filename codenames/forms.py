@@ -10,6 +10,37 @@ from django.utils.translation import gettext_lazy as _
 from .consts import AWAY_TEAM_WORDS_NUMBER, HOME_TEAM_WORDS_NUMBER
 from .consts import SCORE_CHOICES
 from .models import ResultType
+from .models import result_types_registry
+
+EMPTY_CHOICE_LABEL = "---------"
+
+
+def get_result_types_choices():
+    return [("", EMPTY_CHOICE_LABEL)] + [
+        (result_type.id, str(result_type))
+        for result_type in result_types_registry.all()
+    ]
+
+
+def get_result_type(result_type_id: str) -> ResultType:
+    try:
+        return result_types_registry.get(int(result_type_id))
+    except ResultType.DoesNotExist as no_result_type:
+        raise ValidationError(
+            _("Select a valid choice."),
+            code="invalid_choice") from no_result_type
+
+
+class ResultTypeChoiceField(forms.TypedChoiceField):
+    """
+    Choice of result type from models.result_types_registry
+    instead of querying them for every form.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(choices=get_result_types_choices,
+                         coerce=get_result_type,
+                         **kwargs)
 
 
 class AddResultForm(forms.Form):
@@ -30,9 +61,8 @@ class AddResultForm(forms.Form):
         # GameResult field must be first
         self.order_fields(["game"])
 
-    result_type = forms.ModelChoiceField(
+    result_type = ResultTypeChoiceField(
         label=_("Result type:"),
-        queryset=ResultType.objects.all(),
         widget=forms.Select(
             attrs={"onchange": "updateFieldsStates();"}
         )
@@ -0,0 +1,87 @@
+"""
+Request-scoped loader of tournament object graph:
+cup -> groups -> teams -> players -> arenas -> games.
+Result types of games come from models.result_types_registry.
+
+Every object is fetched once and shared (identity map),
+so following foreign keys of loaded objects costs no queries.
+"""
+
+import typing as tp
+
+from .models import Arena, Cup, GameResult, Group, Player, Team
+from .timing import timed_stage
+
+
+class GroupData:
+    """
+    Group with its teams, arenas and games already loaded.
+    """
+
+    def __init__(self, group: Group):
+        self.group: Group = group
+        self.teams: tp.List[Team] = []
+        self.arenas: tp.List[Arena] = []
+        self.games: tp.List[GameResult] = []
+
+    @property
+    def name(self) -> str:
+        return self.group.name
+
+    @property
+    def teams_by_seed(self) -> tp.Dict[int, Team]:
+        return {team.seed: team for team in self.teams}
+
+    def __repr__(self):
+        return (f"GroupData(group={self.group!r}, "
+                f"teams={len(self.teams)}, "
+                f"games={len(self.games)})")
+
+
+@timed_stage("load")
+def load_groups(cup: Cup, groups: tp.List[Group]) -> tp.List[GroupData]:
+    """
+    Load teams, players, arenas and games of groups
+    and link them to each other.
+    """
+    groups_data: tp.Dict[int, GroupData] = {}
+    for group in groups:
+        group.cup = cup
+        groups_data[group.id] = GroupData(group)
+
+    teams: tp.Dict[int, Team] = Team.objects.filter(
+        group__in=groups).in_bulk()
+    players_ids: tp.Set[int] = set()
+    for team in teams.values():
+        players_ids.add(team.first_player_id)
+        if team.second_player_id is not None:
+            players_ids.add(team.second_player_id)
+    players: tp.Dict[int, Player] = Player.objects.in_bulk(players_ids)
+    for team in sorted(teams.values(), key=lambda t: t.id):
+        group_data = groups_data[team.group_id]
+        team.group = group_data.group
+        team.first_player = players[team.first_player_id]
+        if team.second_player_id is not None:
+            team.second_player = players[team.second_player_id]
+        group_data.teams.append(team)
+
+    arenas: tp.Dict[int, Arena] = Arena.objects.filter(
+        group__in=groups).in_bulk()
+    for arena in sorted(arenas.values(), key=lambda a: a.id):
+        group_data = groups_data[arena.group_id]
+        arena.group = group_data.group
+        group_data.arenas.append(arena)
+
+    for game in GameResult.objects.filter(group__in=groups).order_by("id"):
+        group_data = groups_data[game.group_id]
+        game.group = group_data.group
+        # Games may refer to dummy objects out of group: keep them lazy.
+        if game.home_team_id in teams:
+            game.home_team = teams[game.home_team_id]
+        if game.away_team_id in teams:
+            game.away_team = teams[game.away_team_id]
+        if game.arena_id in arenas:
+            game.arena = arenas[game.arena_id]
+        group_data.games.append(game)
+
+    return list(groups_data.values())
@@ -4,11 +4,15 @@ Console command to add empty game results for some group.
 
 import json
 import os
+import typing as tp
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from codenames.consts import CURRENT_CUP_NUMBER
 from codenames.models import Arena, GameResult, Group, Team
+from codenames.models import bump_results_version
+from codenames.schedule import Schedule, generate_round_robin
 
 
 def assert_correct_teams_seeds(teams) -> None:
@@ -32,8 +36,9 @@ class Command(BaseCommand):
         parser.add_argument(
             "-g", "--to_group",
             required=True,
-            action="store",
+            action="append",
             type=str,
+            help="Group to add games to, can be repeated"
         )
         parser.add_argument(
             "--cup_number",
@@ -44,9 +49,10 @@ class Command(BaseCommand):
         )
         parser.add_argument(
             "-d", "--schedule_json_folder",
-            required=True,
             action="store",
             type=str,
+            help="Folder with schedule_{n}.json "
+                 "(default = generate round-robin schedule)"
         )
         parser.add_argument(
             "-n", "--num_teams",
@@ -54,61 +60,103 @@ class Command(BaseCommand):
             action="store",
             type=int,
         )
+        parser.add_argument(
+            "-u", "--upsert",
+            action="store_true",
+            help="Add only games missing in group instead of failing"
+        )
 
     def handle(self, *args, **options):
-        try:
-            dst_group: Group = Group.objects.get(
-                name=options["to_group"],
-                cup__number=options["cup_number"]
-            )
-        except Group.DoesNotExist as group_no_exist:
-            raise CommandError(
-                f"There is no group {options['to_group']} "
-                f"on cup {options['cup_number']}"
-            ) from group_no_exist
-
         group_size: int = options["num_teams"]
-
-        group_teams = Team.objects.filter(group=dst_group)
-        if group_teams.count() != group_size:
+        if options["schedule_json_folder"] is None:
+            schedule = generate_round_robin(group_size)
+        else:
+            schedule_path = os.path.join(
+                options["schedule_json_folder"],
+                f"schedule_{(group_size + 1) // 2 * 2}.json"
+            )
+            with open(schedule_path, "r", encoding="utf-8") as json_src:
+                json_schedule = json.load(json_src)
+            schedule = [json_schedule[f"{round_index + 1}"]
+                        for round_index in range(len(json_schedule))]
+
+        for group_name in options["to_group"]:
+            try:
+                dst_group: Group = Group.objects.get(
+                    name=group_name,
+                    cup__number=options["cup_number"]
+                )
+            except Group.DoesNotExist as group_no_exist:
+                raise CommandError(
+                    f"There is no group {group_name} "
+                    f"on cup {options['cup_number']}"
+                ) from group_no_exist
+            self.add_group_schedule(dst_group, group_size, schedule,
+                                    upsert=options["upsert"],
+                                    verbosity=options["verbosity"])
+
+    def add_group_schedule(self, dst_group: Group, group_size: int,
+                           schedule: Schedule, *,
+                           upsert: bool, verbosity: int):
+        """
+        Create all games of group in one transaction.
+        """
+        teams: tp.List[Team] = list(Team.objects.filter(group=dst_group))
+        if len(teams) != group_size:
             raise CommandError(
-                f"{group_size} teams expected, got {group_teams.count()}")
+                f"{group_size} teams expected, got {len(teams)}")
+        assert_correct_teams_seeds(teams)
+        group_teams: tp.Dict[int, Team] = {team.seed: team for team in teams}
 
-        try:
-            assert_correct_teams_seeds(group_teams)
-        except CommandError as command_error:
-            raise command_error
-
-        schedule_path = os.path.join(
-            options["schedule_json_folder"],
-            f"schedule_{(group_size + 1) // 2 * 2}.json"
-        )
-
-        with open(schedule_path, "r", encoding="utf-8") as json_src:
-            schedule = json.load(json_src)
-
-        group_arenas = Arena.objects.filter(group=dst_group)
-        if group_arenas.count() < group_size // 2:
+        group_arenas: tp.List[Arena] = list(
+            Arena.objects.filter(group=dst_group).order_by("number"))
+        if len(group_arenas) < group_size // 2:
             raise CommandError("too few arenas")
 
-        for round_index in range(len(schedule)):
-            round_games = schedule[f"{round_index + 1}"]
-
-            # TODO: add checking already existing game results
-            for game in round_games:
-                try:
+        with transaction.atomic():
+            # Every pair plays once, whoever is at home:
+            # other schedule may have swapped home and away teams
+            existing_games: tp.Set[tp.FrozenSet[int]] = {
+                frozenset(teams_ids)
+                for teams_ids in GameResult.objects.filter(
+                    group=dst_group).values_list(
+                        "home_team_id", "away_team_id")
+            }
+            if existing_games and not upsert:
+                raise CommandError(
+                    f"Group {dst_group.short} already has "
+                    f"{len(existing_games)} games, use --upsert "
+                    f"to add only missing ones")
+
+            new_games: tp.List[GameResult] = []
+            for round_index, round_games in enumerate(schedule):
+                for game in round_games:
                     # Skip this game if group size is odd
                     # And team skips this rounds
                     # (equals "team plays with dummy team")
-                    game_result = GameResult(
+                    home_team = group_teams.get(game["first"] - 1)
+                    away_team = group_teams.get(game["second"] - 1)
+                    if home_team is None or away_team is None:
+                        continue
+                    if frozenset((home_team.id,
+                                  away_team.id)) in existing_games:
+                        continue
+                    new_games.append(GameResult(
                         group=dst_group,
-                        home_team=group_teams.get(seed=game["first"] - 1),
-                        away_team=group_teams.get(seed=game["second"] - 1),
+                        home_team=home_team,
+                        away_team=away_team,
                         round_number=round_index,
-                        arena=group_arenas.order_by(
-                            "number")[game["seat"] - 1]
-                    )
-                    game_result.save()
-                    print(f"GameResult {game_result} saved")
-                except Team.DoesNotExist:
-                    continue
+                        arena=group_arenas[game["seat"] - 1]
+                    ))
+
+            if new_games:
+                GameResult.objects.bulk_create(new_games)
+                # bulk_create sends no signals
+                bump_results_version(Group.objects.filter(id=dst_group.id))
+
+        if verbosity >= 2:
+            for game_result in new_games:
+                self.stdout.write(f"GameResult {game_result} saved")
+        self.stdout.write(
+            f"{len(new_games)} games saved to group {dst_group.short}, "
+            f"{len(existing_games)} already existed")
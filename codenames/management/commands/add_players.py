@@ -4,85 +4,95 @@ Console command to add players to db.
 
 import typing as tp
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from codenames.models import Player
+from codenames.registration import PLAYERS_DELIMITER
+from codenames.registration import import_players
+from codenames.registration import ImportReport
+from codenames.registration import read_csv_lines, read_txt_lines
 
-PLAYERS_DELIMITER = " - "
-NAMES_DELIMITER = " "
+NORMAL_OUTPUT_VERBOSITY: int = 1
 
 
-NORMAL_OUTPUT_VERBOSITY: int = 1
+def add_source_arguments(parser) -> None:
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--txt",
+        action="store",
+        type=str,
+        help="Text file, one player (or team) in line"
+    )
+    source.add_argument(
+        "--csv",
+        action="store",
+        type=str,
+        help="CSV file, one player in cell, one team in row"
+    )
+    parser.add_argument(
+        "-f", "--first_name_first",
+        action="store_true",
+        help="Use if names are written like Ivan Ivanov not Ivanov Ivan"
+    )
+    parser.add_argument(
+        "-d", "--players_delimiter",
+        action="store",
+        default=PLAYERS_DELIMITER,
+        type=str,
+        help="Delimiter to split players from team"
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Only print what would be added and changed"
+    )
 
 
-def add_one_player(player_line: str,
-                   *,
-                   out: tp.TextIO,
-                   first_name_first: bool,
-                   verbosity: int = NORMAL_OUTPUT_VERBOSITY
-                   ) -> Player:
-    first_name, last_name = player_line.split(NAMES_DELIMITER)
-    if first_name_first:
-        first_name, last_name = last_name, first_name
+def read_source_lines(src: tp.TextIO,
+                      options,
+                      *,
+                      one_player_lines: bool = False
+                      ) -> tp.Iterator[tp.List[str]]:
+    if options["csv"] is not None:
+        return read_csv_lines(src)
+    if one_player_lines:
+        return read_txt_lines(src, players_delimiter=None)
+    return read_txt_lines(src, options["players_delimiter"])
 
-    try:
-        existing_player: Player = Player.objects.get(first_name=first_name,
-                                                     last_name=last_name)
-        if verbosity > NORMAL_OUTPUT_VERBOSITY:
-            out.write(f"Player {existing_player} already exists")
-        return existing_player
-    except Player.DoesNotExist:
-        pass
 
-    new_player: Player = Player(first_name=first_name, last_name=last_name)
-    new_player.save()
-    out.write(f"Player {new_player} saved")
-    return new_player
+def write_report(out: tp.TextIO, report: ImportReport, options) -> None:
+    if options["dry_run"] or options["verbosity"] > NORMAL_OUTPUT_VERBOSITY:
+        for line in report.get_diff_lines():
+            out.write(line)
+    prefix = "Dry run: " if options["dry_run"] else ""
+    out.write(prefix + report.get_summary())
 
 
 class Command(BaseCommand):
     """
-    :usage: manage.py add_players
-    # TODO: add description
+    :usage: manage.py add_players (--txt TXT | --csv CSV) [--dry_run]
+    All players are added in one transaction, existing ones are skipped.
     """
     help = "Add players from file"
 
     def add_arguments(self, parser):
-        parser.add_argument("--txt", required=True, type=str)
-        # TODO: add csv read
-        parser.add_argument(
-            "-f", "--first_name_first",
-            action="store_true",
-            help="Use if names are written like Ivan Ivanov not Ivanov Ivan"
-        )
+        add_source_arguments(parser)
         parser.add_argument(
             "-t", "--from_teams",
             action="store_true",
             help="Use if you want to add participants from teams list."
                  "Delimiter is ' - '"
         )
-        parser.add_argument(
-            "-d", "--players_delimiter",
-            action="store",
-            default=PLAYERS_DELIMITER,
-            type=str,
-            help="Delimiter to split players from team"
-        )
 
     def handle(self, *args, **options):
-        num_players: int = 0
-        with open(options["txt"], "r", encoding="utf-8") as src_txt:
-            for line in src_txt:
-                line = line.strip()
-                if options["from_teams"]:
-                    player_lines = line.split(PLAYERS_DELIMITER)
-                else:
-                    player_lines = [line]
-                for player_line in player_lines:
-                    num_players += 1
-                    add_one_player(
-                        player_line,
-                        out=self.stdout,
-                        first_name_first=options["first_name_first"],
-                        verbosity=options["verbosity"])
-        self.stdout.write(f"{num_players} players processed")
+        path = options["csv"] or options["txt"]
+        with open(path, "r", encoding="utf-8", newline="") as src:
+            lines = read_source_lines(
+                src, options, one_player_lines=not options["from_teams"])
+            try:
+                report = import_players(
+                    lines,
+                    first_name_first=options["first_name_first"],
+                    dry_run=options["dry_run"])
+            except ValueError as wrong_input:
+                raise CommandError(str(wrong_input)) from wrong_input
+        write_report(self.stdout, report, options)
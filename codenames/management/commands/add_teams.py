@@ -4,28 +4,25 @@ Console command to add teams (and players contained) to db.
 
 import typing as tp
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from codenames.consts import CURRENT_CUP_NUMBER
-from codenames.models import Group, Player, Team
-from codenames.models import get_dummy_group_id
-from .add_players import add_one_player
-from .add_players import PLAYERS_DELIMITER
+from codenames.models import Cup, Group
+from codenames.registration import import_teams
+from .add_players import add_source_arguments, read_source_lines
+from .add_players import write_report
 
 
 class Command(BaseCommand):
     """
-    :usage: manage.py add_teams
-    # TODO: add description
+    :usage: manage.py add_teams (--txt TXT | --csv CSV) [-g GROUP] [-s]
+    All teams and players are added in one transaction,
+    existing teams of cup are moved to given group.
     """
     help = "Add teams from file"
 
     def add_arguments(self, parser):
-        parser.add_argument(
-            "--txt",
-            required=True,
-            action="store",
-            type=str)
+        add_source_arguments(parser)
         parser.add_argument(
             "--cup_number",
             action="store",
@@ -33,19 +30,6 @@ class Command(BaseCommand):
             type=int,
             help=f"Cup number (default = {CURRENT_CUP_NUMBER})"
         )
-        # TODO: add csv read
-        parser.add_argument(
-            "-f", "--first_name_first",
-            action="store_true",
-            help="Use if names are written like Ivan Ivanov not Ivanov Ivan"
-        )
-        parser.add_argument(
-            "-d", "--players_delimiter",
-            action="store",
-            default=PLAYERS_DELIMITER,
-            type=str,
-            help="Delimiter to split players from team"
-        )
         parser.add_argument(
             "-g", "--to_group",
             action="store",
@@ -60,66 +44,32 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        with open(options["txt"], "r", encoding="utf-8") as src_txt:
-            for seed, line in enumerate(src_txt):
-                line = line.strip()
-                player_lines = line.split(PLAYERS_DELIMITER)
-
-                players: tp.List[Player] = []
-                for player_line in player_lines:
-                    players.append(
-                        add_one_player(
-                            player_line,
-                            out=self.stdout,
-                            first_name_first=options["first_name_first"],
-                            verbosity=options["verbosity"]))
-
-                team: tp.Optional[Team] = None
-                is_team_new: bool = False
-                this_cup_teams = Team.objects.filter(
-                    cup__number=options["cup_number"])
-                already_existing_teams = (this_cup_teams.filter(
-                    first_player=players[0], second_player=players[1])
-                    | this_cup_teams.filter(
-                        first_player=players[1], second_player=players[0]))
-                if already_existing_teams:
-                    team = already_existing_teams.first()
-                    self.stdout.write(
-                        f"Team {players[0]}/{players[1]} already exists")
-
-                if not team:
-                    team = Team(first_player=players[0],
-                                second_player=players[1])
-                    is_team_new = True
-
-                group: Group = Group.objects.get(id=get_dummy_group_id())
-                if options["to_group"]:
-                    try:
-                        group = Group.objects.get(
-                            name=options["to_group"],
-                            cup__number=CURRENT_CUP_NUMBER)
-                    except Group.DoesNotExist:
-                        self.stdout.write(
-                            f"Group {options['to_group']} don't exist")
+        try:
+            cup: Cup = Cup.objects.get(number=options["cup_number"])
+        except Cup.DoesNotExist as cup_no_exist:
+            raise CommandError(
+                f"There is no cup {options['cup_number']}"
+            ) from cup_no_exist
 
-                team_seed: tp.Optional[int] = None
-                if options["assign_seeds"] and group.dummy:
-                    self.stdout.write(
-                        "Impossible to assign seed for non-existing group")
-                elif options["assign_seeds"]:
-                    team_seed = seed
-                Team.objects.update_or_create(first_player=team.first_player,
-                                              second_player=team.second_player,
-                                              defaults={"group": group,
-                                                        "seed": team_seed})
+        group: tp.Optional[Group] = None
+        if options["to_group"]:
+            try:
+                group = Group.objects.get(name=options["to_group"], cup=cup)
+            except Group.DoesNotExist as group_no_exist:
+                raise CommandError(
+                    f"Group {options['to_group']} don't exist"
+                ) from group_no_exist
 
-                if options["to_group"] and not group.dummy:
-                    if options["assign_seeds"]:
-                        self.stdout.write(
-                            f"Team {team} saved to group {group.short} "
-                            f"(seed {team_seed})")
-                    else:
-                        self.stdout.write(
-                            f"Team {team} saved to group {group.short}")
-                elif is_team_new:
-                    self.stdout.write(f"Team {team} saved")
+        path = options["csv"] or options["txt"]
+        with open(path, "r", encoding="utf-8", newline="") as src:
+            try:
+                report = import_teams(
+                    read_source_lines(src, options),
+                    cup=cup,
+                    group=group,
+                    assign_seeds=options["assign_seeds"],
+                    first_name_first=options["first_name_first"],
+                    dry_run=options["dry_run"])
+            except ValueError as wrong_input:
+                raise CommandError(str(wrong_input)) from wrong_input
+        write_report(self.stdout, report, options)
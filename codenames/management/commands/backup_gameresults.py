@@ -0,0 +1,86 @@
+"""
+Console command to backup game results of cup or group.
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import QuerySet
+
+from codenames.backup import BACKUP_FORMATS, CHUNK_SIZE, write_backup
+from codenames.consts import CURRENT_CUP_NUMBER
+from codenames.models import Cup, GameResult, Group
+
+
+def add_scope_arguments(parser) -> None:
+    parser.add_argument(
+        "--cup_number",
+        action="store",
+        default=CURRENT_CUP_NUMBER,
+        type=int,
+        help=f"Cup number (default = {CURRENT_CUP_NUMBER})"
+    )
+    parser.add_argument(
+        "-g", "--group",
+        action="store",
+        type=str,
+        help="Only this group (default = all groups of cup)"
+    )
+    parser.add_argument(
+        "--chunk_size",
+        action="store",
+        default=CHUNK_SIZE,
+        type=int,
+        help=f"Games in one chunk (default = {CHUNK_SIZE})"
+    )
+
+
+def get_scope_games(options) -> "QuerySet[GameResult]":
+    if not Cup.objects.filter(number=options["cup_number"]).exists():
+        raise CommandError(f"There is no cup {options['cup_number']}")
+    games = GameResult.objects.filter(group__cup__number=options["cup_number"])
+    if options["group"] is None:
+        return games
+    if not Group.objects.filter(name=options["group"],
+                                cup__number=options["cup_number"]).exists():
+        raise CommandError(f"There is no group {options['group']} "
+                           f"on cup {options['cup_number']}")
+    return games.filter(group__name=options["group"])
+
+
+def get_backup_path(backup_format: str) -> str:
+    backup_time_string = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
+    return f"backup_{backup_time_string}.{backup_format}"
+
+
+class Command(BaseCommand):
+    """
+    :usage: manage.py backup_gameresults [-g GROUP] [-o OUTPUT]
+    Restore with restore_gameresults.
+    """
+    help = "Backup game results of cup or group"
+
+    def add_arguments(self, parser):
+        add_scope_arguments(parser)
+        parser.add_argument(
+            "-o", "--output",
+            action="store",
+            type=str,
+            help="Backup file (default = backup_{time}.{format})"
+        )
+        parser.add_argument(
+            "--format",
+            action="store",
+            default=BACKUP_FORMATS[0],
+            choices=BACKUP_FORMATS,
+            help=f"Backup format (default = {BACKUP_FORMATS[0]})"
+        )
+
+    def handle(self, *args, **options):
+        games = get_scope_games(options)
+        path: str = options["output"] or get_backup_path(options["format"])
+        with open(path, "w", encoding="utf-8", newline="") as backup:
+            num_games: int = write_backup(games, backup,
+                                          backup_format=options["format"],
+                                          chunk_size=options["chunk_size"])
+        self.stdout.write(f"{num_games} games saved to {path}")
@@ -0,0 +1,141 @@
+"""
+Console command to benchmark standings on synthetic tournaments.
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from codenames.benchmarks import BENCHMARK_SCENARIOS
+from codenames.benchmarks import compare_results, load_results
+from codenames.benchmarks import run_explain, run_scenario, save_results
+
+BENCHMARK_BASELINE_PATH: str = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    "sources", "benchmark_baseline.json")
+
+# Benchmarks don't touch real cache and real static files manifest
+BENCHMARK_SETTINGS = {
+    "CACHES": {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "codenames-benchmark",
+        }
+    },
+    "STATICFILES_STORAGE":
+        "django.contrib.staticfiles.storage.StaticFilesStorage",
+}
+
+
+class Command(BaseCommand):
+    """
+    :usage: manage.py benchmark_standings [--save] [--compare]
+    Runs in a separate test database (in-memory one for SQLite),
+    real data is never touched.
+    """
+    help = "Benchmark standings on synthetic tournaments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s", "--scenario",
+            action="append",
+            choices=list(BENCHMARK_SCENARIOS),
+            help="Scenario to run (default = all)"
+        )
+        parser.add_argument(
+            "-r", "--repeat",
+            action="store",
+            default=20,
+            type=int,
+            help="Runs of every benchmark (default = 20)"
+        )
+        parser.add_argument(
+            "--seed",
+            action="store",
+            default=0,
+            type=int,
+            help="Seed of synthetic results (default = 0)"
+        )
+        parser.add_argument(
+            "--baseline",
+            action="store",
+            default=BENCHMARK_BASELINE_PATH,
+            type=str,
+            help=f"Baseline json (default = {BENCHMARK_BASELINE_PATH})"
+        )
+        parser.add_argument(
+            "--save",
+            action="store_true",
+            help="Save results as new baseline"
+        )
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="Fail if results are worse than baseline"
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Only explain standings queries on many generated cups"
+        )
+        parser.add_argument(
+            "--time_tolerance",
+            action="store",
+            default=1.5,
+            type=float,
+            help="Allowed ratio of time to baseline time (default = 1.5)"
+        )
+
+    def handle(self, *args, **options):
+        scenarios_names = options["scenario"] or list(BENCHMARK_SCENARIOS)
+
+        old_database_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            if options["explain"]:
+                self.explain(options["repeat"], options["seed"])
+                return
+            with override_settings(**BENCHMARK_SETTINGS):
+                results = {}
+                for scenario_name in scenarios_names:
+                    self.stdout.write(f"Running {scenario_name}...")
+                    results[scenario_name] = run_scenario(
+                        BENCHMARK_SCENARIOS[scenario_name],
+                        options["repeat"],
+                        seed=options["seed"])
+        finally:
+            connection.creation.destroy_test_db(old_database_name,
+                                                verbosity=0)
+
+        for scenario_name, scenario_results in results.items():
+            for name, result in scenario_results.items():
+                self.stdout.write(
+                    f"{scenario_name}.{name}: "
+                    f"{result['time_ms']:.3f} ms, "
+                    f"{result['queries']} queries")
+
+        if options["compare"]:
+            try:
+                baseline = load_results(options["baseline"])
+            except FileNotFoundError as no_baseline:
+                raise CommandError(
+                    f"There is no baseline {options['baseline']}"
+                ) from no_baseline
+            lines, regressions = compare_results(
+                results, baseline, options["time_tolerance"])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError(
+                    "Regressions:\n" + "\n".join(regressions))
+
+        if options["save"]:
+            save_results(results, options["baseline"])
+            self.stdout.write(f"Baseline saved to {options['baseline']}")
+
+    def explain(self, repeat: int, seed: int) -> None:
+        for name, result in run_explain(repeat, seed=seed).items():
+            self.stdout.write(f"{name}: {result['time_ms']:.3f} ms")
+            self.stdout.write(result["plan"])
@@ -0,0 +1,46 @@
+"""
+Console command to check derived result columns of game results.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from codenames.models import GameResult, Group
+from codenames.models import bump_results_version
+from codenames.models import get_result_columns
+from codenames.models import get_result_columns_mismatches
+
+
+class Command(BaseCommand):
+    """
+    :usage: manage.py check_gameresults [--fix]
+    Fails if winner_side, effective_score, finished or result_abbr
+    of some game differ from its result type and score.
+    """
+    help = "Check derived result columns of game results"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Recalculate columns of mismatching games"
+        )
+
+    def handle(self, *args, **options):
+        mismatches = get_result_columns_mismatches(GameResult.objects.all())
+        for game in mismatches:
+            self.stdout.write(f"GameResult {game.id} ({game}) mismatches")
+        if not mismatches:
+            self.stdout.write("All game results are consistent")
+            return
+        if not options["fix"]:
+            raise CommandError(
+                f"{len(mismatches)} game results mismatch, use --fix")
+
+        with transaction.atomic():
+            for game in mismatches:
+                GameResult.objects.filter(id=game.id).update(
+                    **get_result_columns(game.result_type, game.score))
+            bump_results_version(Group.objects.filter(
+                id__in={game.group_id for game in mismatches}))
+        self.stdout.write(f"{len(mismatches)} game results fixed")
@@ -2,13 +2,14 @@
 Console command to add empty game results for some group.
 """
 
-import os
-
-from datetime import datetime
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from codenames.backup import BACKUP_FORMATS, write_backup
 from codenames.consts import CURRENT_CUP_NUMBER
 from codenames.models import GameResult, Group
+from codenames.models import bump_results_version, get_result_columns
+from .backup_gameresults import get_backup_path
 
 
 def assert_correct_teams_seeds(teams) -> None:
@@ -63,14 +64,16 @@ class Command(BaseCommand):
             ) from group_no_exist
 
         group_games = GameResult.objects.filter(group=dst_group)
-        backup_time_string = datetime.now().strftime(
-            "%Y_%m_%d__%H_%M_%S")
-        with open(f"backup_{backup_time_string}.txt", "w") as backup:
-            for game in group_games:
-                print(game, file=backup)
-        # TODO: backup
-        group_games.update(
-            score=0,
-            result_type=None,
-            home_team_fouls=0,
-            away_team_fouls=0)
+        backup_path: str = get_backup_path(BACKUP_FORMATS[0])
+        with open(backup_path, "w", encoding="utf-8") as backup:
+            write_backup(group_games, backup)
+        self.stdout.write(f"Games backup saved to {backup_path}, "
+                          f"restore it with restore_gameresults")
+        with transaction.atomic():
+            group_games.update(
+                score=0,
+                result_type=None,
+                home_team_fouls=0,
+                away_team_fouls=0,
+                **get_result_columns(None, 0))
+            bump_results_version(Group.objects.filter(id=dst_group.id))
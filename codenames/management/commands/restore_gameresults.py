@@ -0,0 +1,43 @@
+"""
+Console command to restore game results of cup or group from backup.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from codenames.backup import BackupError, read_backup, restore_games
+from codenames.models import ResultType
+from .backup_gameresults import add_scope_arguments, get_scope_games
+
+
+class Command(BaseCommand):
+    """
+    :usage: manage.py restore_gameresults -i INPUT [-g GROUP]
+    Backup is made by backup_gameresults,
+    all games are restored in one transaction,
+    games of backup out of cup or group are skipped.
+    """
+    help = "Restore game results of cup or group from backup"
+
+    def add_arguments(self, parser):
+        add_scope_arguments(parser)
+        parser.add_argument(
+            "-i", "--input",
+            required=True,
+            action="store",
+            type=str,
+            help="Backup file (JSON lines or CSV)"
+        )
+
+    def handle(self, *args, **options):
+        games = get_scope_games(options)
+        with open(options["input"], "r", encoding="utf-8",
+                  newline="") as backup:
+            try:
+                num_games, num_skipped = restore_games(
+                    games, read_backup(backup),
+                    batch_size=options["chunk_size"])
+            except (BackupError, ResultType.DoesNotExist) as wrong_backup:
+                raise CommandError(str(wrong_backup)) from wrong_backup
+        self.stdout.write(f"{num_games} games restored from "
+                          f"{options['input']}, {num_skipped} games "
+                          f"out of scope skipped")
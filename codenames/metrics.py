@@ -0,0 +1,201 @@
+"""
+In-process SQL metrics of views in Prometheus text format.
+
+SQLMetricsMiddleware wraps database cursor of every request,
+aggregates number of queries and SQL time by view into histograms
+and keeps the slowest statements, metrics_view exposes them
+to staff users and to scrapers with settings.SQL_METRICS_TOKEN.
+Requests slower than settings.SQL_METRICS_SLOW_REQUEST_MS are logged
+with their SQL.
+
+Metrics are collected only if settings.SQL_METRICS is on.
+Every worker process has its own metrics.
+"""
+
+import logging
+import threading
+import time
+import typing as tp
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+QUERIES_BUCKETS: tp.Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200)
+SQL_SECONDS_BUCKETS: tp.Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SLOWEST_STATEMENTS_NUMBER: int = 10
+STATEMENT_MAX_LENGTH: int = 300
+SLOW_REQUEST_MS: int = 500
+
+UNRESOLVED_VIEW: str = "unresolved"
+
+# (duration, view name, statement)
+StatementTiming = tp.Tuple[float, str, str]
+
+
+class Histogram:
+    """
+    Cumulative Prometheus histogram.
+    """
+
+    def __init__(self, buckets: tp.Tuple[float, ...]):
+        self.buckets: tp.Tuple[float, ...] = buckets
+        self.counts: tp.List[int] = [0] * len(buckets)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_lines(self, name: str, labels: str) -> tp.List[str]:
+        lines: tp.List[str] = [
+            f'{name}_bucket{{{labels},le="{bucket:g}"}} {count}'
+            for bucket, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:g}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.queries = Histogram(QUERIES_BUCKETS)
+        self.sql_seconds = Histogram(SQL_SECONDS_BUCKETS)
+
+
+class RequestQueries:
+    """
+    Statements of one request with their durations.
+    """
+
+    def __init__(self):
+        self.statements: tp.List[tp.Tuple[str, float]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((sql, time.perf_counter() - start))
+
+    @property
+    def duration(self) -> float:
+        return sum(duration for _, duration in self.statements)
+
+
+class SQLMetrics:
+    """
+    SQL metrics of all views of process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views: tp.Dict[str, ViewMetrics] = {}
+        self.slowest: tp.List[StatementTiming] = []
+
+    def record(self, view_name: str, queries: RequestQueries) -> None:
+        slowest: tp.List[StatementTiming] = sorted(
+            ((duration, view_name, " ".join(sql.split()))
+             for sql, duration in queries.statements),
+            reverse=True)[:SLOWEST_STATEMENTS_NUMBER]
+        with self._lock:
+            view_metrics = self.views.setdefault(view_name, ViewMetrics())
+            view_metrics.queries.observe(len(queries.statements))
+            view_metrics.sql_seconds.observe(queries.duration)
+            self.slowest = sorted(self.slowest + slowest,
+                                  reverse=True)[:SLOWEST_STATEMENTS_NUMBER]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.views = {}
+            self.slowest = []
+
+    def render(self) -> str:
+        """
+        Metrics in Prometheus text exposition format.
+        """
+        lines: tp.List[str] = [
+            "# HELP codenames_view_sql_queries "
+            "Number of SQL queries of request by view.",
+            "# TYPE codenames_view_sql_queries histogram",
+        ]
+        with self._lock:
+            views = sorted(self.views.items())
+            for view_name, view_metrics in views:
+                lines += view_metrics.queries.get_lines(
+                    "codenames_view_sql_queries",
+                    f'view="{escape_label(view_name)}"')
+            lines += [
+                "# HELP codenames_view_sql_seconds "
+                "SQL time of request by view.",
+                "# TYPE codenames_view_sql_seconds histogram",
+            ]
+            for view_name, view_metrics in views:
+                lines += view_metrics.sql_seconds.get_lines(
+                    "codenames_view_sql_seconds",
+                    f'view="{escape_label(view_name)}"')
+            lines += [
+                "# HELP codenames_sql_slowest_statement_seconds "
+                "Slowest SQL statements since start.",
+                "# TYPE codenames_sql_slowest_statement_seconds gauge",
+            ]
+            for rank, (duration, view_name, sql) in enumerate(self.slowest):
+                lines.append(
+                    f"codenames_sql_slowest_statement_seconds{{"
+                    f'rank="{rank + 1}",'
+                    f'view="{escape_label(view_name)}",'
+                    f'statement="{escape_label(sql[:STATEMENT_MAX_LENGTH])}"'
+                    f"}} {duration:g}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    return (value.replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+sql_metrics = SQLMetrics()
+
+
+class SQLMetricsMiddleware:
+    """
+    Records SQL of every request into sql_metrics.
+    Is used only if settings.SQL_METRICS is on.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_METRICS", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_ms: int = getattr(
+            settings, "SQL_METRICS_SLOW_REQUEST_MS", SLOW_REQUEST_MS)
+
+    def __call__(self, request):
+        queries = RequestQueries()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        view_name: str = match.view_name if match else UNRESOLVED_VIEW
+        sql_metrics.record(view_name, queries)
+
+        if duration_ms > self.slow_request_ms:
+            logger.warning(
+                "Slow request %s %s (%s): %.1f ms, "
+                "%d queries in %.1f ms\n%s",
+                request.method, request.path, view_name, duration_ms,
+                len(queries.statements), queries.duration * 1000,
+                "\n".join(f"{duration * 1000:.1f} ms: {sql}"
+                          for sql, duration in queries.statements))
+        return response
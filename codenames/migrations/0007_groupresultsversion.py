@@ -0,0 +1,22 @@
+# Generated by Django 3.1.3 on 2026-10-18 02:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codenames', '0006_auto_20201225_1419'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupResultsVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField(default=0)),
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='results_version', to='codenames.group')),
+            ],
+        ),
+    ]
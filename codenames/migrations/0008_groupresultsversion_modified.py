@@ -0,0 +1,18 @@
+# Generated by Django 3.1.3 on 2026-10-18 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codenames', '0007_groupresultsversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupresultsversion',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.1.3 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+def get_result_columns(result_type, score):
+    """
+    Copy of codenames.models.get_result_columns at this migration.
+    """
+    if result_type is None:
+        return {
+            'winner_side': '',
+            'effective_score': 0,
+            'finished': False,
+            'result_abbr': '',
+        }
+    finished = not result_type.do_delete
+    effective_score = 0
+    if finished:
+        effective_score = (result_type._auto_score if result_type.is_auto
+                           else score)
+    return {
+        'winner_side': 'H' if result_type.is_home_win else 'A',
+        'effective_score': effective_score,
+        'finished': finished,
+        'result_abbr': result_type.abbr,
+    }
+
+
+def backfill_result_columns(apps, schema_editor):
+    GameResult = apps.get_model('codenames', 'GameResult')
+    games = GameResult.objects.exclude(result_type=None).select_related(
+        'result_type')
+    for game in games.iterator():
+        GameResult.objects.filter(id=game.id).update(
+            **get_result_columns(game.result_type, game.score))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codenames', '0008_groupresultsversion_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameresult',
+            name='effective_score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='gameresult',
+            name='finished',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='gameresult',
+            name='result_abbr',
+            field=models.CharField(blank=True, default='', editable=False, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='gameresult',
+            name='winner_side',
+            field=models.CharField(blank=True, choices=[('', '---'), ('H', 'Home'), ('A', 'Away')], default='', editable=False, max_length=1),
+        ),
+        migrations.RunPython(backfill_result_columns,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.3 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codenames', '0009_gameresult_result_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gameresult',
+            index=models.Index(fields=['group', 'away_team'], name='gameresult_group_away_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gameresult',
+            index=models.Index(fields=['group', 'round_number'], name='gameresult_group_round_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='gameresult',
+            constraint=models.UniqueConstraint(fields=('group', 'home_team', 'away_team'), name='unique_game_in_group'),
+        ),
+        migrations.AddConstraint(
+            model_name='group',
+            constraint=models.UniqueConstraint(fields=('cup', 'name'), name='unique_group_name_in_cup'),
+        ),
+        migrations.AddConstraint(
+            model_name='team',
+            constraint=models.UniqueConstraint(fields=('group', 'seed'), name='unique_team_seed_in_group'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.3 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codenames', '0010_standings_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gameresult',
+            index=models.Index(fields=['group', 'finished', 'winner_side'], name='gameresult_group_result_idx'),
+        ),
+    ]
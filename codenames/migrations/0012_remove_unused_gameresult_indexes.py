@@ -0,0 +1,21 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codenames', '0011_gameresult_group_result_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='gameresult',
+            name='gameresult_group_away_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gameresult',
+            name='gameresult_group_round_idx',
+        ),
+    ]
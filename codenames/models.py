@@ -2,11 +2,17 @@
 Models for codenamess app.
 """
 
+import hashlib
+import time
 import typing as tp
 
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_init, post_migrate
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from .consts import get_score_str
@@ -17,6 +23,55 @@ from .consts import SCORE_CHOICES
 from .consts import MAX_ARENAS_NUMBER
 from .consts import AWAY_TEAM_WORDS_NUMBER, HOME_TEAM_WORDS_NUMBER
 from .consts import DUMMY_GROUP_NAME, DUMMY_STRING_REPRESENTATION
+from .consts import AWAY_SIDE, HOME_SIDE, WINNER_SIDE_CHOICES
+
+
+class SentinelIds:
+    """
+    Process-wide memo of ids of dummy objects used as field defaults,
+    so building model instances costs no hidden get_or_create.
+
+    Id is memoized only once its object is committed:
+    object created in a transaction is memoized on commit,
+    so rolled back objects (e.g. in tests) are never used.
+    Memo is cleared after every migrate and flush (post_migrate).
+    """
+
+    def __init__(self):
+        self._ids: tp.Dict[tp.Hashable, int] = {}
+        # (key, id) of objects created in not yet committed transactions
+        self._uncommitted: tp.Set[tp.Tuple[tp.Hashable, int]] = set()
+
+    def get(self, model: tp.Type[models.Model], **lookup) -> int:
+        """
+        Id of object of model got or created by lookup.
+        """
+        key = (model._meta.label, tuple(sorted(lookup.items())))
+        if key in self._ids:
+            return self._ids[key]
+        obj, created = model.objects.get_or_create(**lookup)
+        if created and connection.in_atomic_block:
+            self._uncommitted.add((key, obj.id))
+            transaction.on_commit(lambda: self._commit(key, obj.id))
+        elif (key, obj.id) not in self._uncommitted:
+            self._ids[key] = obj.id
+        return obj.id
+
+    def _commit(self, key: tp.Hashable, id_: int) -> None:
+        self._uncommitted.discard((key, id_))
+        self._ids[key] = id_
+
+    def clear(self) -> None:
+        self._ids.clear()
+        self._uncommitted.clear()
+
+
+sentinel_ids = SentinelIds()
+
+
+@receiver(post_migrate)
+def clear_sentinel_ids(sender, **kwargs):
+    sentinel_ids.clear()
 
 
 class Cup(models.Model):
@@ -39,7 +94,7 @@ class Cup(models.Model):
 
 
 def get_current_cup_id():
-    return Cup.objects.get_or_create(number=CURRENT_CUP_NUMBER)[0].id
+    return sentinel_ids.get(Cup, number=CURRENT_CUP_NUMBER)
 
 
 class Group(models.Model):
@@ -66,6 +121,12 @@ class Group(models.Model):
         default=False
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cup", "name"],
+                                    name="unique_group_name_in_cup"),
+        ]
+
     @property
     def short(self):
         return f"{self.name}"
@@ -81,11 +142,11 @@ class Group(models.Model):
 
 
 def get_dummy_group() -> Group:
-    return Group.objects.get_or_create(name=DUMMY_GROUP_NAME, dummy=True)[0]
+    return Group.objects.get(id=get_dummy_group_id())
 
 
 def get_dummy_group_id() -> int:
-    return get_dummy_group().id
+    return sentinel_ids.get(Group, name=DUMMY_GROUP_NAME, dummy=True)
 
 
 class Player(models.Model):
@@ -122,23 +183,25 @@ class Player(models.Model):
 
 
 def get_dummy_player() -> Player:
-    return Player.objects.get_or_create(first_name="$Name",
-                                        last_name="$No",
-                                        dummy=True)[0]
+    return Player.objects.get(id=get_dummy_player_id())
 
 
 def get_dummy_player_id() -> int:
-    return get_dummy_player().id
+    return sentinel_ids.get(Player,
+                            first_name="$Name",
+                            last_name="$No",
+                            dummy=True)
 
 
 def get_another_dummy_player() -> Player:
-    return Player.objects.get_or_create(first_name="$Suchplayer",
-                                        last_name="$No",
-                                        dummy=True)[0]
+    return Player.objects.get(id=get_another_dummy_player_id())
 
 
 def get_another_dummy_player_id() -> int:
-    return get_another_dummy_player().id
+    return sentinel_ids.get(Player,
+                            first_name="$Suchplayer",
+                            last_name="$No",
+                            dummy=True)
 
 
 class Team(models.Model):
@@ -206,6 +269,13 @@ class Team(models.Model):
         default=False
     )
 
+    class Meta:
+        constraints = [
+            # Teams out of group have no seed
+            models.UniqueConstraint(fields=["group", "seed"],
+                                    name="unique_team_seed_in_group"),
+        ]
+
     @property
     def short(self):
         if not self.second_player:
@@ -225,15 +295,14 @@ class Team(models.Model):
 
 
 def get_dummy_team() -> Team:
-    return Team.objects.get_or_create(
-        first_player=get_dummy_player(),
-        second_player=get_another_dummy_player(),
-        dummy=True
-    )[0]
+    return Team.objects.get(id=get_dummy_team_id())
 
 
 def get_dummy_team_id() -> int:
-    return get_dummy_team().id
+    return sentinel_ids.get(Team,
+                            first_player_id=get_dummy_player_id(),
+                            second_player_id=get_another_dummy_player_id(),
+                            dummy=True)
 
 
 class ResultType(models.Model):
@@ -291,6 +360,103 @@ class ResultType(models.Model):
                     _('away team auto win: chosen score says the opposite'))
 
 
+# Seconds after which result types registry is refetched
+RESULT_TYPES_REGISTRY_TIMEOUT: int = 30
+
+
+class ResultTypeRegistry:
+    """
+    Process-wide cache of result types by id and by abbr.
+
+    Result types are constants seeded by add_resulttypes,
+    so they are fetched once and refetched only after some result type
+    is saved or deleted in this process, unknown id is asked for
+    (e.g. after test database reset) or RESULT_TYPES_REGISTRY_TIMEOUT
+    seconds after fetch. So other processes use changed result types
+    in at most RESULT_TYPES_REGISTRY_TIMEOUT seconds; fingerprint
+    of fetched result types keys anything cached from them meanwhile.
+    """
+
+    def __init__(self):
+        # (by id, by abbr, fingerprint) or None if not loaded
+        self._result_types: tp.Optional[
+            tp.Tuple[tp.Dict[int, ResultType], tp.Dict[str, ResultType], str]
+        ] = None
+        self._loaded: float = 0.0
+
+    def _load(self):
+        if (self._result_types is not None
+                and time.monotonic() - self._loaded
+                > RESULT_TYPES_REGISTRY_TIMEOUT):
+            self.invalidate()
+        if self._result_types is None:
+            by_id: tp.Dict[int, ResultType] = ResultType.objects.in_bulk()
+            fields: str = repr([
+                (result_type.id, result_type.abbr, result_type.is_auto,
+                 result_type.is_home_win, result_type._auto_score,
+                 result_type.do_delete)
+                for result_type in map(by_id.get, sorted(by_id))
+            ])
+            self._result_types = (
+                by_id,
+                {result_type.abbr: result_type
+                 for result_type in by_id.values()},
+                hashlib.md5(fields.encode("utf-8")).hexdigest()[:8],
+            )
+            self._loaded = time.monotonic()
+        return self._result_types
+
+    def invalidate(self) -> None:
+        self._result_types = None
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Hash of fetched result types, changes with any of them.
+        """
+        return self._load()[2]
+
+    def all(self) -> tp.List[ResultType]:
+        by_id, _, _ = self._load()
+        return [by_id[id_] for id_ in sorted(by_id)]
+
+    def get(self, id_: int) -> ResultType:
+        """
+        :raises ResultType.DoesNotExist: if there is no such result type
+        """
+        by_id, _, _ = self._load()
+        if id_ not in by_id:
+            self.invalidate()
+            by_id, _, _ = self._load()
+        try:
+            return by_id[id_]
+        except KeyError as no_result_type:
+            raise ResultType.DoesNotExist(
+                f"no result type with id {id_}") from no_result_type
+
+    def get_by_abbr(self, abbr: str) -> ResultType:
+        """
+        :raises ResultType.DoesNotExist: if there is no such result type
+        """
+        _, by_abbr, _ = self._load()
+        if abbr not in by_abbr:
+            self.invalidate()
+            _, by_abbr, _ = self._load()
+        try:
+            return by_abbr[abbr]
+        except KeyError as no_result_type:
+            raise ResultType.DoesNotExist(
+                f"no result type {abbr}") from no_result_type
+
+
+result_types_registry = ResultTypeRegistry()
+
+
+@receiver([post_save, post_delete], sender=ResultType)
+def invalidate_result_types_registry(sender, instance, **kwargs):
+    result_types_registry.invalidate()
+
+
 class Arena(models.Model):
     """
     Fields:
@@ -332,11 +498,11 @@ class Arena(models.Model):
 
 
 def get_dummy_arena() -> Arena:
-    return Arena.objects.get_or_create(number=0, dummy=True)[0]
+    return Arena.objects.get(id=get_dummy_arena_id())
 
 
 def get_dummy_arena_id() -> int:
-    return get_dummy_arena().id
+    return sentinel_ids.get(Arena, number=0, dummy=True)
 
 
 class GameResult(models.Model):
@@ -351,6 +517,14 @@ class GameResult(models.Model):
     ->arena
     home_team_fouls
     away_team_fouls
+    winner_side
+    effective_score
+    finished
+    result_abbr
+
+    Last four are derived from result_type and score on save
+    to filter and aggregate by results in db,
+    use get_result_columns for queryset update.
     """
 
     group = models.ForeignKey(
@@ -412,6 +586,60 @@ class GameResult(models.Model):
                     MaxValueValidator(HOME_TEAM_WORDS_NUMBER)]
     )
 
+    # Side that won by result type, "" if there is no result
+    winner_side = models.CharField(
+        default="",
+        blank=True,
+        max_length=1,
+        choices=WINNER_SIDE_CHOICES,
+        editable=False
+    )
+    # home_score of finished game, else 0
+    effective_score = models.IntegerField(
+        default=0,
+        editable=False
+    )
+    finished = models.BooleanField(
+        default=False,
+        editable=False
+    )
+    result_abbr = models.CharField(
+        default="",
+        blank=True,
+        max_length=2,
+        editable=False
+    )
+
+    class Meta:
+        constraints = [
+            # Home and away teams play once in group
+            models.UniqueConstraint(
+                fields=["group", "home_team", "away_team"],
+                name="unique_game_in_group"),
+        ]
+        indexes = [
+            # Filtering and aggregating games of group by results
+            models.Index(fields=["group", "finished", "winner_side"],
+                         name="gameresult_group_result_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        game = super().from_db(db, field_names, values)
+        # Take result type from registry instead of lazy fetch
+        if game.__dict__.get("result_type_id") is not None:
+            game.result_type = result_types_registry.get(game.result_type_id)
+        return game
+
+    def save(self, *args, **kwargs):
+        result_type: tp.Optional[ResultType] = None
+        if self.result_type_id is not None:
+            result_type = result_types_registry.get(self.result_type_id)
+        for name, value in get_result_columns(result_type,
+                                              self.score).items():
+            setattr(self, name, value)
+        super().save(*args, **kwargs)
+
     @property
     def finished_long(self) -> str:
         auto_result_type: str = (f" ({self.result_type.abbr[0]})"
@@ -490,3 +718,138 @@ class GameResult(models.Model):
         if self.result_type.is_away_win and self.score > 0:
             raise ValidationError(
                 _("away team won: chosen score says the opposite"))
+
+
+def get_result_columns(result_type: tp.Optional[ResultType],
+                       score: int) -> tp.Dict[str, tp.Any]:
+    """
+    Values of derived result columns of GameResult.
+    Only fields of result type are used, so it works in migrations too.
+    """
+    if result_type is None:
+        return {
+            "winner_side": "",
+            "effective_score": 0,
+            "finished": False,
+            "result_abbr": "",
+        }
+    finished: bool = not result_type.do_delete
+    effective_score: int = 0
+    if finished:
+        effective_score = (result_type._auto_score if result_type.is_auto
+                           else score)
+    return {
+        "winner_side": HOME_SIDE if result_type.is_home_win else AWAY_SIDE,
+        "effective_score": effective_score,
+        "finished": finished,
+        "result_abbr": result_type.abbr,
+    }
+
+
+def get_result_columns_mismatches(
+        games: "models.QuerySet[GameResult]") -> tp.List[GameResult]:
+    """
+    Games whose derived result columns differ from result type and score.
+    """
+    mismatches: tp.List[GameResult] = []
+    for game in games.select_related("result_type"):
+        columns = get_result_columns(game.result_type, game.score)
+        if any(getattr(game, name) != value
+               for name, value in columns.items()):
+            mismatches.append(game)
+    return mismatches
+
+
+class GroupResultsVersion(models.Model):
+    """
+    Fields:
+    ->group
+    version
+    modified
+
+    Version is bumped on every write of group data
+    to invalidate cached standings.
+    Kept out of Group so that dummy defaults keep working in migrations.
+    """
+
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        related_name="results_version"
+    )
+
+    version = models.IntegerField(
+        default=0
+    )
+
+    modified = models.DateTimeField(
+        auto_now=True
+    )
+
+    def __str__(self):
+        return f"{self.group} (results version {self.version})"
+
+
+def get_results_version(group: Group) -> int:
+    """
+    Group results version; use select_related("results_version").
+    """
+    try:
+        return group.results_version.version
+    except GroupResultsVersion.DoesNotExist:
+        return 0
+
+
+def bump_results_version(groups: "models.QuerySet[Group]") -> None:
+    """
+    Invalidate cached standings of groups.
+    """
+    groups_ids: tp.List[int] = list(groups.values_list("id", flat=True))
+    for group_id in groups_ids:
+        GroupResultsVersion.objects.get_or_create(group_id=group_id)
+    GroupResultsVersion.objects.filter(group_id__in=groups_ids).update(
+        version=models.F("version") + 1,
+        modified=timezone.now())
+
+
+@receiver(post_init, sender=GameResult)
+@receiver(post_init, sender=Team)
+@receiver(post_init, sender=Arena)
+def remember_saved_group_id(sender, instance, **kwargs):
+    # group_id is not in __dict__ if it is deferred
+    instance._saved_group_id = instance.__dict__.get("group_id")
+
+
+@receiver([post_save, post_delete], sender=GameResult)
+@receiver([post_save, post_delete], sender=Team)
+@receiver([post_save, post_delete], sender=Arena)
+def bump_group_results_version(sender, instance, **kwargs):
+    """
+    Bump both groups if instance is moved to other group.
+    """
+    groups_ids: tp.Set[int] = {instance.group_id}
+    if instance._saved_group_id is not None:
+        groups_ids.add(instance._saved_group_id)
+    bump_results_version(Group.objects.filter(id__in=groups_ids))
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_save, sender=ResultType)
+def update_result_type_games(sender, instance, **kwargs):
+    """
+    Recompute derived result columns of games of changed result type.
+    """
+    columns: tp.Dict[str, tp.Any] = get_result_columns(instance, 0)
+    if columns["finished"] and not instance.is_auto:
+        columns["effective_score"] = models.F("score")
+    GameResult.objects.filter(result_type=instance).update(**columns)
+    bump_results_version(Group.objects.filter(
+        gameresultgroup__result_type=instance).distinct())
+
+
+@receiver(post_save, sender=Player)
+def bump_player_groups_results_version(sender, instance, **kwargs):
+    bump_results_version(Group.objects.filter(
+        models.Q(teamgroup__first_player=instance)
+        | models.Q(teamgroup__second_player=instance)
+    ))
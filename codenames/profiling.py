@@ -0,0 +1,138 @@
+"""
+Profiling of standings views on real data by staff users.
+
+Staff user adds ?profile=cpu (cProfile) or ?profile=memory (tracemalloc)
+to url of standings or add result page and gets top of report
+instead of the page:
+- top: number of lines of report (default PROFILE_TOP)
+- sort: pstats sort key of cpu report (default "cumulative")
+- save: save cpu profile as .prof file to settings.PROFILE_DIR
+  to open it with pstats or snakeviz
+"""
+
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+import typing as tp
+
+from django.conf import settings
+from django.http import HttpResponse
+
+PROFILE_PARAMETER: str = "profile"
+CPU_PROFILE: str = "cpu"
+MEMORY_PROFILE: str = "memory"
+
+PROFILE_TOP: int = 40
+PROFILE_SORT: str = "cumulative"
+
+# Names of codenames urls whose views can be profiled
+PROFILED_URL_NAMES: tp.FrozenSet[str] = frozenset([
+    "index",
+    "all_groups_tables",
+    "one_group_table",
+    "add_result",
+])
+
+# Python profilers are process-wide, so requests are profiled one by one
+_profiling_lock = threading.Lock()
+
+
+def get_profile_path(request, profile_dir: str) -> str:
+    time_string = datetime.datetime.now().strftime("%Y_%m_%d__%H_%M_%S_%f")
+    url_name = request.resolver_match.url_name
+    return os.path.join(profile_dir, f"{url_name}_{time_string}.prof")
+
+
+def profile_cpu(request, call_view: tp.Callable[[], HttpResponse],
+                *, top: int, sort: str) -> str:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        call_view()
+    finally:
+        profiler.disable()
+
+    report = io.StringIO()
+    profile_dir = getattr(settings, "PROFILE_DIR", None)
+    if request.GET.get("save") and profile_dir:
+        profile_path = get_profile_path(request, profile_dir)
+        profiler.dump_stats(profile_path)
+        report.write(f"Profile saved to {profile_path}\n\n")
+    pstats.Stats(profiler, stream=report).sort_stats(sort).print_stats(top)
+    return report.getvalue()
+
+
+def profile_memory(call_view: tp.Callable[[], HttpResponse],
+                   *, top: int) -> str:
+    was_tracing: bool = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        call_view()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    differences = after.compare_to(before, "lineno")
+    lines: tp.List[str] = [
+        f"Peak traced memory: {peak / 1024:.1f} KiB",
+        f"Top {top} lines by allocated memory:",
+    ]
+    lines += [str(difference) for difference in differences[:top]]
+    return "\n".join(lines) + "\n"
+
+
+class ProfilingMiddleware:
+    """
+    Runs standings views under cProfile or tracemalloc
+    if staff user asks for it.
+    Should be after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = request.GET.get(PROFILE_PARAMETER)
+        if profile not in (CPU_PROFILE, MEMORY_PROFILE):
+            return None
+        if not request.user.is_staff:
+            return None
+        match = request.resolver_match
+        if (match.app_name != "codenames"
+                or match.url_name not in PROFILED_URL_NAMES):
+            return None
+
+        try:
+            top = int(request.GET.get("top", PROFILE_TOP))
+        except ValueError:
+            top = PROFILE_TOP
+        sort = request.GET.get("sort", PROFILE_SORT)
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            sort = PROFILE_SORT
+
+        def call_view() -> HttpResponse:
+            return view_func(request, *view_args, **view_kwargs)
+
+        if not _profiling_lock.acquire(blocking=False):
+            return HttpResponse("Another request is being profiled",
+                                content_type="text/plain; charset=utf-8",
+                                status=503)
+        try:
+            if profile == CPU_PROFILE:
+                report = profile_cpu(request, call_view, top=top, sort=sort)
+            else:
+                report = profile_memory(call_view, top=top)
+        finally:
+            _profiling_lock.release()
+        return HttpResponse(report, content_type="text/plain; charset=utf-8")
@@ -0,0 +1,294 @@
+"""
+Bulk import of registration lists: players and teams.
+
+Input is streamed line by line (TXT) or row by row (CSV).
+All existing players and teams of the cup are loaded into dicts once,
+new objects are bulk created in one transaction,
+so import makes the same number of queries for any list size.
+"""
+
+import csv
+import typing as tp
+
+from django.db import transaction
+
+from .models import Cup, Group, Player, Team
+from .models import bump_results_version, get_dummy_group
+
+PLAYERS_DELIMITER = " - "
+NAMES_DELIMITER = " "
+
+BULK_BATCH_SIZE: int = 500
+
+# (first_name, last_name)
+PlayerKey = tp.Tuple[str, str]
+# Players keys of team, order of players doesn't matter
+TeamKey = tp.FrozenSet[PlayerKey]
+
+
+def read_txt_lines(src: tp.TextIO,
+                   players_delimiter: tp.Optional[str] = PLAYERS_DELIMITER
+                   ) -> tp.Iterator[tp.List[str]]:
+    """
+    Players names of every non-empty line.
+    :param players_delimiter: None if line is one player
+    """
+    for line in src:
+        line = line.strip()
+        if not line:
+            continue
+        if players_delimiter is None:
+            yield [line]
+        else:
+            yield [player_line.strip()
+                   for player_line in line.split(players_delimiter)]
+
+
+def read_csv_lines(src: tp.TextIO) -> tp.Iterator[tp.List[str]]:
+    """
+    Players names of every non-empty row, one player in cell.
+    """
+    for row in csv.reader(src):
+        player_lines = [cell.strip() for cell in row if cell.strip()]
+        if player_lines:
+            yield player_lines
+
+
+def get_player_key(player_line: str, *, first_name_first: bool) -> PlayerKey:
+    try:
+        first_name, last_name = player_line.split(NAMES_DELIMITER)
+    except ValueError as wrong_line:
+        raise ValueError(
+            f"Player {player_line!r} is not two words") from wrong_line
+    if first_name_first:
+        first_name, last_name = last_name, first_name
+    return first_name, last_name
+
+
+def load_players_index() -> tp.Dict[PlayerKey, Player]:
+    return {
+        (player.first_name, player.last_name): player
+        for player in Player.objects.filter(dummy=False)
+    }
+
+
+def load_teams_index(cup: Cup) -> tp.Dict[TeamKey, Team]:
+    teams = Team.objects.filter(cup=cup, dummy=False).select_related(
+        "first_player", "second_player", "group")
+    return {
+        frozenset(
+            (player.first_name, player.last_name)
+            for player in (team.first_player, team.second_player)
+            if player is not None
+        ): team
+        for team in teams
+    }
+
+
+class ImportReport:
+    """
+    What import adds and changes.
+    """
+
+    def __init__(self):
+        self.new_players: tp.List[Player] = []
+        self.num_existing_players: int = 0
+        self.new_teams: tp.List[Team] = []
+        # Team -> {field name: (old value, new value)}
+        self.changed_teams: tp.List[
+            tp.Tuple[Team, tp.Dict[str, tp.Tuple[tp.Any, tp.Any]]]] = []
+        self.num_existing_teams: int = 0
+        self.duplicate_lines: tp.List[int] = []
+
+    def get_diff_lines(self) -> tp.List[str]:
+        lines: tp.List[str] = []
+        lines += [f"+ Player {player}" for player in self.new_players]
+        lines += [f"+ Team {team}" for team in self.new_teams]
+        for team, changes in self.changed_teams:
+            lines.append(f"~ Team {team}: " + ", ".join(
+                f"{name} {old} -> {new}"
+                for name, (old, new) in changes.items()))
+        lines += [f"! Line {line_number} repeats team"
+                  for line_number in self.duplicate_lines]
+        return lines
+
+    def get_summary(self) -> str:
+        summary = (f"{len(self.new_players)} new players, "
+                   f"{self.num_existing_players} already existed")
+        if self.new_teams or self.changed_teams or self.num_existing_teams:
+            summary += (f"; {len(self.new_teams)} new teams, "
+                        f"{len(self.changed_teams)} changed, "
+                        f"{self.num_existing_teams} unchanged")
+        return summary
+
+
+class RegistrationImport:
+    """
+    Players and teams of one import, resolved against existing ones.
+    Nothing is written before save().
+    """
+
+    def __init__(self, cup: tp.Optional[Cup], *, first_name_first: bool):
+        self.cup: tp.Optional[Cup] = cup
+        self.first_name_first: bool = first_name_first
+        self.players_index: tp.Dict[PlayerKey, Player] = load_players_index()
+        self.report = ImportReport()
+        self.teams_index: tp.Optional[tp.Dict[TeamKey, Team]] = None
+        # Players of new teams, they get players ids only in save()
+        self.new_teams_players: tp.List[tp.List[PlayerKey]] = []
+        # Teams of all lines, new and existing, to find repeated lines
+        self.teams_keys: tp.Set[TeamKey] = set()
+        self.changed_teams_groups_ids: tp.Set[int] = set()
+
+    def add_player(self, player_line: str) -> PlayerKey:
+        key = get_player_key(player_line,
+                             first_name_first=self.first_name_first)
+        if key in self.players_index:
+            if self.players_index[key].pk is not None:
+                self.report.num_existing_players += 1
+        else:
+            new_player = Player(first_name=key[0], last_name=key[1])
+            self.players_index[key] = new_player
+            self.report.new_players.append(new_player)
+        return key
+
+    def add_team(self, player_lines: tp.List[str], *,
+                 line_number: int,
+                 group: Group,
+                 seed: tp.Optional[int]) -> None:
+        """
+        Add new team to group or move existing team of cup there.
+        """
+        if not 1 <= len(player_lines) <= 2:
+            raise ValueError(f"Line {line_number}: team must have "
+                             f"1 or 2 players, got {len(player_lines)}")
+        if self.teams_index is None:
+            self.teams_index = load_teams_index(self.cup)
+
+        players_keys = [self.add_player(player_line)
+                        for player_line in player_lines]
+        team_key: TeamKey = frozenset(players_keys)
+        if team_key in self.teams_keys:
+            self.report.duplicate_lines.append(line_number)
+            return
+        self.teams_keys.add(team_key)
+        team = self.teams_index.get(team_key)
+        if team is None:
+            team = Team(first_player=self.players_index[players_keys[0]],
+                        cup=self.cup, group=group, seed=seed)
+            if len(players_keys) == 2:
+                team.second_player = self.players_index[players_keys[1]]
+            self.report.new_teams.append(team)
+            self.new_teams_players.append(players_keys)
+            return
+
+        changes = {}
+        if team.group_id != group.id:
+            changes["group"] = (team.group.short, group.short)
+        if team.seed != seed:
+            changes["seed"] = (team.seed, seed)
+        if not changes:
+            self.report.num_existing_teams += 1
+            return
+        self.changed_teams_groups_ids.add(team.group_id)
+        team.group = group
+        team.seed = seed
+        self.report.changed_teams.append((team, changes))
+
+    def release_taken_seeds(self) -> None:
+        """
+        Clear seeds of teams out of import that imported teams take,
+        e.g. of withdrawn team whose seed goes to the next team.
+        """
+        if self.teams_index is None:
+            return
+        changed_teams_ids: tp.Set[int] = {
+            team.id for team, _ in self.report.changed_teams}
+        taken_seeds: tp.Set[tp.Tuple[int, int]] = {
+            (team.group_id, team.seed)
+            for team in self.report.new_teams + [
+                team for team, _ in self.report.changed_teams]
+            if team.seed is not None
+        }
+        for team in self.teams_index.values():
+            if (team.id not in changed_teams_ids
+                    and (team.group_id, team.seed) in taken_seeds):
+                self.report.changed_teams.append(
+                    (team, {"seed": (team.seed, None)}))
+                team.seed = None
+
+    def save(self) -> None:
+        with transaction.atomic():
+            Player.objects.bulk_create(self.report.new_players,
+                                       batch_size=BULK_BATCH_SIZE)
+            if self.report.new_players and self.report.new_teams:
+                # bulk_create doesn't set ids on every db backend
+                self.players_index = load_players_index()
+                for team, players_keys in zip(self.report.new_teams,
+                                              self.new_teams_players):
+                    team.first_player = self.players_index[players_keys[0]]
+                    if len(players_keys) == 2:
+                        team.second_player = (
+                            self.players_index[players_keys[1]])
+            # Seeds are unique in group, so changed teams drop old seeds
+            # before any team gets new one
+            changed_teams = [team for team, _ in self.report.changed_teams]
+            Team.objects.filter(
+                id__in=[team.id for team in changed_teams]
+            ).update(seed=None)
+            Team.objects.bulk_update(changed_teams, ["group", "seed"],
+                                     batch_size=BULK_BATCH_SIZE)
+            Team.objects.bulk_create(self.report.new_teams,
+                                     batch_size=BULK_BATCH_SIZE)
+
+            # Bulk operations send no signals
+            groups_ids = self.changed_teams_groups_ids | {
+                team.group_id
+                for team in self.report.new_teams + [
+                    team for team, _ in self.report.changed_teams]
+            }
+            if groups_ids:
+                bump_results_version(Group.objects.filter(id__in=groups_ids))
+
+
+def import_players(lines: tp.Iterable[tp.List[str]], *,
+                   first_name_first: bool,
+                   dry_run: bool = False) -> ImportReport:
+    """
+    Add all players of lines that don't exist yet.
+    """
+    registration = RegistrationImport(None, first_name_first=first_name_first)
+    for player_lines in lines:
+        for player_line in player_lines:
+            registration.add_player(player_line)
+    if not dry_run:
+        registration.save()
+    return registration.report
+
+
+def import_teams(lines: tp.Iterable[tp.List[str]], *,
+                 cup: Cup,
+                 group: tp.Optional[Group],
+                 assign_seeds: bool,
+                 first_name_first: bool,
+                 dry_run: bool = False) -> ImportReport:
+    """
+    Add teams (and their players) of lines to group,
+    teams without group go to dummy group.
+    :param assign_seeds: seeds of teams in group are their lines order
+    """
+    if group is None:
+        group = get_dummy_group()
+    if assign_seeds and group.dummy:
+        raise ValueError("Impossible to assign seeds in dummy group")
+
+    registration = RegistrationImport(cup, first_name_first=first_name_first)
+    for line_index, player_lines in enumerate(lines):
+        registration.add_team(player_lines,
+                              line_number=line_index + 1,
+                              group=group,
+                              seed=line_index if assign_seeds else None)
+    registration.release_taken_seeds()
+    if not dry_run:
+        registration.save()
+    return registration.report
@@ -0,0 +1,127 @@
+"""
+Results of group games as dense matrices indexed by team seeds.
+
+matrix[stat][seed][rival_seed] is value of stat for team with seed
+in its games against team with rival_seed, so tie breakers of team
+are row reductions and head-to-head tie breakers of tied teams are
+reductions over sub-matrix of their seeds.
+
+Pure python lists are used: groups are at most MAX_GROUP_SIZE teams,
+so overhead of array library calls would exceed the work itself.
+"""
+
+import typing as tp
+
+from .models import GameResult
+
+# Stats kept for every pair of teams
+RESULT_MATRIX_STATS = [
+    "won",
+    "games_played",
+    "finished",
+    "absences",
+    "serious_fouls",
+    "fouls",
+    "black_loses",
+    "words_difference",
+]
+
+# Result types that count against the losing team
+LOSER_RESULT_TYPES_STATS = {
+    "A1": "absences",
+    "A2": "absences",
+    "F1": "serious_fouls",
+    "F2": "serious_fouls",
+    "B1": "black_loses",
+    "B2": "black_loses",
+}
+
+Matrix = tp.List[tp.List[int]]
+
+
+class ResultMatrix:
+    """
+    Matrices of stats of all games between teams of one group.
+    """
+
+    def __init__(self, num_teams: int):
+        self.num_teams: int = num_teams
+        self.stats: tp.Dict[str, Matrix] = {
+            stat: [[0] * num_teams for _ in range(num_teams)]
+            for stat in RESULT_MATRIX_STATS
+        }
+
+    @classmethod
+    def from_games(cls,
+                   num_teams: int,
+                   games: tp.Iterable[GameResult]) -> "ResultMatrix":
+        """
+        Games must have home_team, away_team and result_type fetched.
+        Games with teams out of group are skipped.
+        """
+        matrix = cls(num_teams)
+        for game in games:
+            home_seed = game.home_team.seed
+            away_seed = game.away_team.seed
+            if home_seed is None or away_seed is None:
+                continue
+            matrix.add_game(home_seed, away_seed, game)
+        return matrix
+
+    def copy(self) -> "ResultMatrix":
+        matrix = ResultMatrix(self.num_teams)
+        matrix.stats = {
+            stat: [list(row) for row in values]
+            for stat, values in self.stats.items()
+        }
+        return matrix
+
+    def add_game(self, home_seed: int, away_seed: int,
+                 game: GameResult) -> None:
+        stats = self.stats
+        stats["fouls"][home_seed][away_seed] += game.home_team_fouls
+        stats["fouls"][away_seed][home_seed] += game.away_team_fouls
+
+        result_type = game.result_type
+        if result_type is None:
+            return
+        if result_type.is_home_win:
+            winner, loser = home_seed, away_seed
+        else:
+            winner, loser = away_seed, home_seed
+        stats["won"][winner][loser] += 1
+        stats["games_played"][winner][loser] += 1
+        stats["games_played"][loser][winner] += 1
+        if result_type.abbr in LOSER_RESULT_TYPES_STATS:
+            stats[LOSER_RESULT_TYPES_STATS[result_type.abbr]][loser][
+                winner] += 1
+
+        if not game.is_finished:
+            return
+        stats["finished"][winner][loser] += 1
+        stats["finished"][loser][winner] += 1
+        if not result_type.is_auto:
+            stats["words_difference"][winner][loser] += game.absolute_score
+        stats["words_difference"][loser][winner] -= game.absolute_score
+
+    def row_sum(self, stat: str, seed: int,
+                rivals_seeds: tp.Optional[tp.Iterable[int]] = None) -> int:
+        """
+        Sum of stat of team in games against rivals (all by default).
+        """
+        row = self.stats[stat][seed]
+        if rivals_seeds is None:
+            return sum(row)
+        return sum(row[rival_seed] for rival_seed in rivals_seeds)
+
+    def count_finished_games(self, seeds: tp.Collection[int]) -> int:
+        """
+        Number of finished games between teams with seeds.
+        """
+        finished = self.stats["finished"]
+        return sum(
+            finished[seed][rival_seed]
+            for seed in seeds
+            for rival_seed in seeds
+            if seed < rival_seed
+        )
@@ -0,0 +1,59 @@
+"""
+Round-robin schedules (Berger tables) for groups of any size.
+
+Schedule has same format as sources/schedule_{n}.json:
+list of rounds, round is list of games {"seat", "first", "second"},
+where "first" is home team seed and all numbers are 1-based.
+"""
+
+import typing as tp
+
+ScheduleGame = tp.Dict[str, int]
+Schedule = tp.List[tp.List[ScheduleGame]]
+
+
+def generate_round_robin(num_teams: int) -> Schedule:
+    """
+    Schedule where every team plays every other team once
+    in O(num_teams ** 2).
+
+    Berger tables: team num_teams stays in place, others rotate.
+    Home and away games alternate with minimal number of breaks
+    (num_teams - 2 for even num_teams, none for odd),
+    seats rotate every round, so teams change arenas.
+    If num_teams is odd, every round one team rests.
+    """
+    if num_teams < 2:
+        raise ValueError(f"at least 2 teams needed, got {num_teams}")
+    # Team with number num_rotating plays "rest" games if num_teams is odd
+    num_slots: int = num_teams + num_teams % 2
+    num_rotating: int = num_slots - 1
+    num_seats: int = num_teams // 2
+
+    schedule: Schedule = []
+    for round_index in range(num_rotating):
+        pairs: tp.List[tp.Tuple[int, int]] = []
+        # Fixed team plays at home every other round
+        if round_index % 2 == 0:
+            pairs.append((round_index, num_rotating))
+        else:
+            pairs.append((num_rotating, round_index))
+        for shift in range(1, num_slots // 2):
+            first = (round_index + shift) % num_rotating
+            second = (round_index - shift) % num_rotating
+            if shift % 2 == 1:
+                first, second = second, first
+            pairs.append((first, second))
+
+        round_games: tp.List[ScheduleGame] = []
+        for first, second in pairs:
+            if first >= num_teams or second >= num_teams:
+                continue
+            round_games.append({
+                "seat": (len(round_games) + round_index) % num_seats + 1,
+                "first": first + 1,
+                "second": second + 1,
+            })
+        schedule.append(round_games)
+
+    return schedule
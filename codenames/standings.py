@@ -0,0 +1,171 @@
+"""
+Cached standings (result tables and schedules) of groups.
+
+Every group standings are cached as rendered HTML fragment
+under group results version, which is stored in db and bumped
+on every write of group data, so every worker sees a write
+on its next request whatever cache backend is used.
+Pages are assembled from fragments, only changed groups are rendered.
+
+Rendering is single-flight: the request rendering missing fragments
+locks results versions rows of their groups in db, other requests
+(of any worker process) wait for the lock and then take fragments
+from cache instead of rendering them too.
+Fragments are shared between workers if cache is (database cache
+by default, see settings).
+"""
+
+import datetime
+import hashlib
+import typing as tp
+
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import SafeString
+
+from .loader import GroupData, load_groups
+from .models import Cup, Group, GroupResultsVersion
+from .models import get_results_version, result_types_registry
+from .table_render import get_recent_games_schedule
+from .table_render import get_upcoming_games_schedule
+from .table_render import render_result_table_content
+from .table_render import render_result_table_header
+from .table_render import render_table_html
+from .timing import stage
+
+STANDINGS_CACHE_TIMEOUT: int = 60 * 60
+
+# Bump on changes of standings templates or rendering,
+# so fragments and ETags of previous release are not served
+STANDINGS_RENDER_VERSION: int = 1
+
+
+def get_standings_cache_key(cup: Cup, group: Group, do_sort: bool) -> str:
+    return (
+        f"codenames:standings:{STANDINGS_RENDER_VERSION}:"
+        f"{cup.id}:{group.id}:{group.name}:"
+        f"{get_results_version(group)}:"
+        f"{result_types_registry.fingerprint}:"
+        f"{'sorted' if do_sort else 'unsorted'}:"
+        f"{translation.get_language()}"
+    )
+
+
+def get_groups_etag(groups: tp.List[Group]) -> str:
+    """
+    ETag that changes whenever results version or name of any group
+    or rendering of standings changes.
+    Groups should be fetched with select_related("results_version").
+    """
+    versions: str = f"{STANDINGS_RENDER_VERSION}:" + ",".join(
+        f"{group.id}:{group.name}:{get_results_version(group)}"
+        for group in sorted(groups, key=lambda g: g.id)
+    )
+    return hashlib.md5(versions.encode("utf-8")).hexdigest()
+
+
+def get_groups_last_modified(
+        groups: tp.List[Group]) -> tp.Optional[datetime.datetime]:
+    """
+    Time of last write to groups, None if it is unknown.
+    Groups should be fetched with select_related("results_version").
+    """
+    modified: tp.List[datetime.datetime] = []
+    for group in groups:
+        try:
+            modified.append(group.results_version.modified)
+        except GroupResultsVersion.DoesNotExist:
+            return None
+    return max(modified, default=None)
+
+
+def render_group_standings(group_data: GroupData,
+                           do_sort: bool) -> SafeString:
+    table_html = render_table_html(
+        render_result_table_header(group_data),
+        render_result_table_content(group_data, do_sort))
+    with stage("fragments"):
+        return render_to_string(
+            "codenames/group_standings.html",
+            {
+                "group_name": group_data.name,
+                "group_table_html": table_html,
+                "upcoming_games": get_upcoming_games_schedule(group_data),
+                "recent_games": get_recent_games_schedule(group_data),
+            }
+        )
+
+
+def render_groups_standings(
+        cup: Cup,
+        groups: tp.List[Group],
+        do_sort: bool,
+        cache_keys: tp.Dict[int, str]) -> tp.Dict[str, SafeString]:
+    """
+    Render standings of groups and put them to cache.
+    :return: dict {cache key: standings HTML}
+    """
+    rendered_standings = {
+        cache_keys[group_data.group.id]: render_group_standings(
+            group_data, do_sort)
+        for group_data in load_groups(cup, groups)
+    }
+    with stage("cache"):
+        cache.set_many(rendered_standings, STANDINGS_CACHE_TIMEOUT)
+    return rendered_standings
+
+
+def lock_results_versions(groups: tp.List[Group]) -> None:
+    """
+    Lock results versions rows of groups until end of transaction.
+    Rows are locked in order of groups ids, so requests don't deadlock.
+    Groups should be fetched with select_related("results_version").
+    """
+    for group in groups:
+        try:
+            group.results_version
+        except GroupResultsVersion.DoesNotExist:
+            GroupResultsVersion.objects.get_or_create(group=group)
+    list(GroupResultsVersion.objects.select_for_update().filter(
+        group__in=groups).order_by("group_id").values_list("id", flat=True))
+
+
+def get_groups_standings(cup: Cup,
+                         groups: tp.List[Group],
+                         do_sort: bool) -> tp.Dict[str, SafeString]:
+    """
+    Get standings HTML of groups, rendering only groups missing in cache.
+    Groups should be fetched with select_related("results_version").
+    :return: dict {group_name: standings HTML}
+    """
+    cache_keys: tp.Dict[int, str] = {
+        group.id: get_standings_cache_key(cup, group, do_sort)
+        for group in groups
+    }
+    with stage("cache"):
+        standings: tp.Dict[str, SafeString] = cache.get_many(
+            cache_keys.values())
+
+    missing_groups = [
+        group for group in groups if cache_keys[group.id] not in standings
+    ]
+    if not missing_groups:
+        return {group.name: standings[cache_keys[group.id]]
+                for group in groups}
+
+    with transaction.atomic():
+        with stage("lock"):
+            lock_results_versions(missing_groups)
+        # Other requests could render them while this one waited for lock
+        with stage("cache"):
+            standings.update(cache.get_many(
+                [cache_keys[group.id] for group in missing_groups]))
+        missing_groups = [group for group in missing_groups
+                          if cache_keys[group.id] not in standings]
+        if missing_groups:
+            standings.update(render_groups_standings(
+                cup, missing_groups, do_sort, cache_keys))
+
+    return {group.name: standings[cache_keys[group.id]] for group in groups}
@@ -0,0 +1,182 @@
+"""
+Seeded synthetic tournaments for benchmarks and tests.
+
+Cups are created through the real models with the real round-robin
+schedules from sources, so generated data looks like tournament day data.
+Same arguments always give same cup.
+"""
+
+import io
+import json
+import os
+import random
+import typing as tp
+from string import ascii_uppercase
+
+from django.core.management import call_command
+
+from .consts import AWAY_TEAM_WORDS_NUMBER, HOME_TEAM_WORDS_NUMBER
+from .consts import DUMMY_GROUP_NAME
+from .models import Arena, Cup, GameResult, Group, Player, ResultType, Team
+from .models import bump_results_version, get_result_columns
+from .models import result_types_registry
+
+SCHEDULES_FOLDER: str = os.path.join(os.path.dirname(__file__), "sources")
+
+SYNTHETIC_GROUP_NAMES: tp.List[str] = [
+    letter for letter in ascii_uppercase if letter != DUMMY_GROUP_NAME
+]
+
+FIRST_NAMES = ["Ivan", "Petr", "Anna", "Olga", "Igor", "Maria", "Oleg"]
+LAST_NAMES = ["Ivanov", "Petrov", "Smirnov", "Popov", "Volkov", "Orlov"]
+
+# Result types of finished games with their relative frequency
+RESULT_TYPES_WEIGHTS: tp.Dict[str, int] = {
+    "W1": 30,
+    "W2": 30,
+    "B1": 5,
+    "B2": 5,
+    "T1": 3,
+    "T2": 3,
+    "A1": 1,
+    "A2": 1,
+    "F1": 1,
+    "F2": 1,
+}
+# Tie-heavy games are 1-word wins without fouls,
+# so teams with same number of wins are tied on all base tie breakers.
+TIE_HEAVY_RESULT_TYPES_WEIGHTS: tp.Dict[str, int] = {
+    "W1": 1,
+    "W2": 1,
+}
+FOULS_CHOICES: tp.List[int] = [0, 0, 0, 0, 1, 2]
+
+
+def load_schedule(num_teams: int) -> tp.List[tp.List[tp.Dict[str, int]]]:
+    """
+    Rounds of schedule for group of num_teams teams, seats and seeds
+    are 1-based like in sources.
+    """
+    schedule_path = os.path.join(
+        SCHEDULES_FOLDER, f"schedule_{(num_teams + 1) // 2 * 2}.json")
+    with open(schedule_path, "r", encoding="utf-8") as json_src:
+        schedule = json.load(json_src)
+    return [schedule[f"{round_index + 1}"]
+            for round_index in range(len(schedule))]
+
+
+def finish_game(game: GameResult,
+                rng: random.Random,
+                result_types: tp.Dict[str, ResultType],
+                tie_heavy: bool) -> None:
+    weights = (TIE_HEAVY_RESULT_TYPES_WEIGHTS if tie_heavy
+               else RESULT_TYPES_WEIGHTS)
+    abbr: str = rng.choices(list(weights), weights=list(weights.values()))[0]
+    result_type = result_types[abbr]
+    game.result_type = result_type
+    if result_type.is_auto:
+        game.score = 0
+    elif tie_heavy:
+        game.score = 1 if result_type.is_home_win else -1
+    elif result_type.is_home_win:
+        game.score = rng.randint(1, AWAY_TEAM_WORDS_NUMBER)
+    else:
+        game.score = -rng.randint(1, HOME_TEAM_WORDS_NUMBER)
+    if not tie_heavy:
+        game.home_team_fouls = rng.choice(FOULS_CHOICES)
+        game.away_team_fouls = rng.choice(FOULS_CHOICES)
+    # Games are bulk created without save
+    for name, value in get_result_columns(result_type, game.score).items():
+        setattr(game, name, value)
+
+
+def generate_group(cup: Cup,
+                   group_name: str,
+                   *,
+                   num_teams: int,
+                   completion: float,
+                   tie_heavy: bool,
+                   rng: random.Random,
+                   result_types: tp.Dict[str, ResultType]) -> Group:
+    group = Group.objects.create(cup=cup, name=group_name)
+
+    # Not bulk_create: it doesn't set ids on every db backend.
+    arenas: tp.List[Arena] = [
+        Arena.objects.create(group=group, number=number)
+        for number in range(1, max(num_teams // 2, 1) + 1)
+    ]
+    teams: tp.List[Team] = [
+        Team.objects.create(
+            first_player=Player.objects.create(
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=f"{rng.choice(LAST_NAMES)}{group_name}{seed}a"),
+            second_player=Player.objects.create(
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=f"{rng.choice(LAST_NAMES)}{group_name}{seed}b"),
+            group=group,
+            cup=cup,
+            seed=seed)
+        for seed in range(num_teams)
+    ]
+
+    games: tp.List[GameResult] = []
+    for round_number, round_games in enumerate(load_schedule(num_teams)):
+        for game in round_games:
+            home_seed, away_seed = game["first"] - 1, game["second"] - 1
+            # Team skips round if group size is odd
+            if home_seed >= num_teams or away_seed >= num_teams:
+                continue
+            games.append(GameResult(group=group,
+                                    home_team=teams[home_seed],
+                                    away_team=teams[away_seed],
+                                    round_number=round_number,
+                                    arena=arenas[game["seat"] - 1]))
+    # Tournament goes round by round
+    for game in games[:round(completion * len(games))]:
+        finish_game(game, rng, result_types, tie_heavy)
+    GameResult.objects.bulk_create(games)
+
+    return group
+
+
+def generate_cup(cup_number: int,
+                 *,
+                 num_groups: int,
+                 num_teams: int,
+                 completion: float = 1.0,
+                 tie_heavy: bool = False,
+                 seed: int = 0) -> Cup:
+    """
+    Create cup with num_groups groups of num_teams teams each
+    and all their scheduled games.
+    :param completion: part of games (round by round) that are finished
+    :param tie_heavy: make results that leave many teams tied
+    :param seed: seed of random results
+    """
+    if not 0 <= completion <= 1:
+        raise ValueError(f"completion {completion} is not in [0, 1]")
+    if num_groups > len(SYNTHETIC_GROUP_NAMES):
+        raise ValueError(f"too many groups: {num_groups}")
+
+    call_command("add_resulttypes", stdout=io.StringIO())
+    result_types: tp.Dict[str, ResultType] = {
+        result_type.abbr: result_type
+        for result_type in result_types_registry.all()
+    }
+
+    rng = random.Random(seed)
+    # Current cup may be already created by dummy defaults
+    cup = Cup.objects.get_or_create(number=cup_number)[0]
+    groups: tp.List[Group] = [
+        generate_group(cup, group_name,
+                       num_teams=num_teams,
+                       completion=completion,
+                       tie_heavy=tie_heavy,
+                       rng=rng,
+                       result_types=result_types)
+        for group_name in SYNTHETIC_GROUP_NAMES[:num_groups]
+    ]
+    # Games are bulk created without signals
+    bump_results_version(Group.objects.filter(
+        id__in=[group.id for group in groups]))
+    return cup
@@ -2,16 +2,23 @@
 Rendering functions for future html tables
 """
 
-import copy
+import collections
+import itertools
 import typing as tp
 
+from django.utils.html import escape
+from django.utils.safestring import SafeString, mark_safe
+
 from .consts import get_score_str
-from .models import GameResult, Group, Team
+from .loader import GroupData
+from .models import GameResult
+from .result_matrix import ResultMatrix
 from .table_consts import TABLE_COLUMNS_AFTER_RESULTS_ORDER
 from .table_consts import TABLE_COLUMNS_BEFORE_RESULTS_ORDER
 from .tiebreak import TIE_BREAKERS_ORDER, TIE_BREAKERS_WEIGHTS
 from .tiebreak import OPTIONAL_TIE_BREAKERS
-from .tiebreak import tie_breaker_calculators
+from .tiebreak import count_base_tie_breakers, count_tie_breaker
+from .timing import timed_stage
 
 
 class HtmlTableCell:
@@ -19,6 +26,9 @@ class HtmlTableCell:
     Class that stores all information to pass to html table rendering.
     """
 
+    # Groups have dozens of cells, and they are cached
+    __slots__ = ("_classes", "content", "title")
+
     def __init__(self,
                  *,
                  class_: str = None,
@@ -27,11 +37,11 @@ class HtmlTableCell:
                  title: tp.Optional[str] = None):
         if class_ is not None and classes is not None:
             raise TypeError("please specify either class_ or classes")
-        self._classes: tp.List[str] = []
+        self._classes: tp.Tuple[str, ...] = ()
         if class_ is not None:
-            self._classes.append(class_)
+            self._classes = (class_,)
         if classes is not None:
-            self._classes = copy.deepcopy(classes)
+            self._classes = tuple(classes)
         self.content: str = ""
         if content:
             self.content = content
@@ -53,11 +63,38 @@ class HtmlTableCell:
         return f"{self.content}"
 
 
-def render_result_table_header(group: Group) -> None:
+def render_cells_html(tag: str, cells: tp.List[HtmlTableCell]) -> str:
+    parts: tp.List[str] = ["<tr>"]
+    for cell in cells:
+        class_ = cell.class_
+        parts.append(f'<{tag} class="{escape(class_)}">' if class_
+                     else f"<{tag}>")
+        parts.append(f'<div title="{escape(cell.title)}">' if cell.title
+                     else "<div>")
+        parts.append(escape(cell.content))
+        parts.append(f"</div></{tag}>")
+    parts.append("</tr>")
+    return "".join(parts)
+
+
+@timed_stage("table_html")
+def render_table_html(header: tp.List[HtmlTableCell],
+                      table: tp.List[tp.List[HtmlTableCell]]) -> SafeString:
+    """
+    HTML <table> of header and rows of cells in one pass.
+    """
+    return mark_safe(
+        "<table>"
+        + render_cells_html("th", header)
+        + "".join(render_cells_html("td", row) for row in table)
+        + "</table>")
+
+
+def render_result_table_header(group_data: GroupData) -> None:
     """
     TODO: stub
     """
-    group_size = Team.objects.filter(group=group).count()
+    group_size = len(group_data.teams)
     header_row = {
         cell.class_: cell for cell in [
             HtmlTableCell(class_="place_header", content="#", title="Место"),
@@ -114,18 +151,14 @@ def get_gameresult_cell(game_result: GameResult,
         title=title)
 
 
-def get_row(seed, team, group, num_teams):
+@timed_stage("rows")
+def get_row(seed, team, num_teams, *, home_games, away_games, tie_breakers):
     """
     Return dict of HtmlTableCell objects for one team.
+    :param home_games: list of team home games
+    :param away_games: list of team away games
+    :param tie_breakers: base tie breakers of team
     """
-    home_games = GameResult.objects.filter(home_team=team, group=group)
-    away_games = GameResult.objects.filter(away_team=team, group=group)
-
-    tie_breakers = {
-        tb: tie_breaker_calculators[tb](home_games, away_games)
-        for tb in TIE_BREAKERS_ORDER
-        if tb not in OPTIONAL_TIE_BREAKERS
-    }
 
     result_subrow: tp.List[HtmlTableCell] = [
         HtmlTableCell(
@@ -184,6 +217,7 @@ def get_row(seed, team, group, num_teams):
     return row
 
 
+@timed_stage("reorder")
 def get_result_table_with_sorted_results(table):
     num_teams = len(table)
     sorted_table = [None for seed in range(num_teams)]
@@ -205,117 +239,121 @@ def get_result_table_with_sorted_results(table):
     return sorted_table
 
 
-def are_all_games_finished(games, num_teams):
+def are_all_games_finished(result_matrix: ResultMatrix, seeds):
+    num_teams = len(seeds)
     needed_games_amount = num_teams * (num_teams - 1) // 2
-    return needed_games_amount == len([
-        game for game in games if game.is_finished
-    ])
-
-
-def count_optional_tie_breaker(group: Group,
-                               tie_breaker,
-                               table,
-                               shared_places):
-    # Start counting from scratch.
-    for row in table:
-        row["tie_breakers"][tie_breaker] = 0
-    for place in set(shared_places):
-        if shared_places.count(place) == 1:
-            # No need for tie breaking
-            continue
-        place_sharing_seeds = {
-            i: row["seed"]
-            for i, row in enumerate(table)
-            if row["tie_breakers"]["shared_place"] == place
-        }
-        games = GameResult.objects.filter(
-            group=group,
-            home_team__seed__in=place_sharing_seeds.values(),
-            away_team__seed__in=place_sharing_seeds.values(),
-        )
+    return needed_games_amount == result_matrix.count_finished_games(seeds)
 
-        if not are_all_games_finished(games, len(place_sharing_seeds)):
-            continue
-        for idx, seed in place_sharing_seeds.items():
-            tb_calculator = tie_breaker_calculators[tie_breaker]
-            table[idx]["tie_breakers"][tie_breaker] = tb_calculator(
-                home_games=games.filter(home_team__seed=seed),
-                away_games=games.filter(away_team__seed=seed)
-            )
-        for row in table:
-            row["tie_breakers"][tie_breaker] *= (
-                TIE_BREAKERS_WEIGHTS[tie_breaker])
 
+HeadToHeadTable = tp.Dict[int, tp.Dict[str, int]]
 
-def calculate_places(group: Group, table):
-    # Give shared_place 1 to everyone.
-    for row in table:
-        row["tie_breakers"]["shared_place"] = 0
 
-    num_teams = len(table)
+def count_head_to_head_table(
+        result_matrix: ResultMatrix,
+        seeds: tp.FrozenSet[int]) -> tp.Optional[HeadToHeadTable]:
+    """
+    Weighted values of all optional tie breakers
+    in games between tied teams: {seed: {tie_breaker: value}},
+    None if tied teams haven't finished all games with each other.
+    """
+    if not are_all_games_finished(result_matrix, seeds):
+        return None
+    return {
+        seed: {
+            tie_breaker: TIE_BREAKERS_WEIGHTS[tie_breaker] * count_tie_breaker(
+                result_matrix, tie_breaker, seed, seeds)
+            for tie_breaker in OPTIONAL_TIE_BREAKERS
+        }
+        for seed in seeds
+    }
 
-    tie_breaker_idx = 0
-    while tie_breaker_idx < len(TIE_BREAKERS_ORDER):
-        shared_places = [row["tie_breakers"]["shared_place"] for row in table]
-        num_ties_before_breaking = num_teams - len(set(shared_places))
 
-        tie_breaker = TIE_BREAKERS_ORDER[tie_breaker_idx]
+def break_tie(result_matrix: ResultMatrix,
+              tie_breaker,
+              tied_rows,
+              head_to_head_tables: tp.Dict[tp.FrozenSet[int],
+                                           tp.Optional[HeadToHeadTable]]):
+    """
+    Split rows of tied teams by tie breaker.
+    :param head_to_head_tables: memo of head-to-head tables by tied seeds
+    :return: list of blocks of rows still tied, best block first
+    """
+    if tie_breaker in OPTIONAL_TIE_BREAKERS:
+        tied_seeds = frozenset(row["seed"] for row in tied_rows)
+        if tied_seeds not in head_to_head_tables:
+            head_to_head_tables[tied_seeds] = count_head_to_head_table(
+                result_matrix, tied_seeds)
+        head_to_head_table = head_to_head_tables[tied_seeds]
+        if head_to_head_table is None:
+            # Tie breaker is not applicable.
+            return [tied_rows]
+        tie_break_value = (
+            lambda row: head_to_head_table[row["seed"]][tie_breaker])
+    else:
+        tie_break_value = lambda row: row["tie_breakers"][tie_breaker]
+    return [
+        list(block) for _, block in itertools.groupby(
+            sorted(tied_rows, key=tie_break_value),
+            key=tie_break_value)
+    ]
 
-        if tie_breaker in OPTIONAL_TIE_BREAKERS:
-            count_optional_tie_breaker(
-                group, tie_breaker, table, shared_places)
 
-        tie_breakers = [
-            "shared_place"
-        ] + TIE_BREAKERS_ORDER[:tie_breaker_idx + 1]
+@timed_stage("places")
+def calculate_places(result_matrix: ResultMatrix, table):
+    """
+    Sort table by places and set "shared_place" of every row.
+    Teams are kept as ordered blocks of tied teams,
+    and every next tie breaker refines only blocks still tied.
+    """
+    num_teams = len(table)
+    blocks = [list(table)]
+    head_to_head_tables = {}
 
-        tie_break_values = lambda item: [
-            item["tie_breakers"][tb]
-            for tb in tie_breakers
-        ]
-        table.sort(
-            key=tie_break_values,
-        )
+    tie_breaker_idx = 0
+    while (tie_breaker_idx < len(TIE_BREAKERS_ORDER)
+           and len(blocks) < num_teams):
+        tie_breaker = TIE_BREAKERS_ORDER[tie_breaker_idx]
+        num_blocks_before_breaking = len(blocks)
 
-        new_shared_places = [0 for _ in range(num_teams)]
-        for place in range(1, num_teams):
-            previous_row = table[place - 1]
-            current_row = table[place]
-            if tie_break_values(previous_row) == tie_break_values(current_row):
-                # Shares place with previous team.
-                new_shared_places[place] = new_shared_places[place - 1]
+        refined_blocks = []
+        for block in blocks:
+            if len(block) == 1:
+                refined_blocks.append(block)
             else:
-                # Get next place.
-                new_shared_places[place] = place
-        for place in range(num_teams):
-            table[place]["tie_breakers"][
-                "shared_place"
-            ] = new_shared_places[place]
-
-        # Check if that tie breaker helps
-        num_ties_after_breaking = num_teams - len(
-            {row["tie_breakers"]["shared_place"] for row in table}
-        )
+                refined_blocks.extend(
+                    break_tie(result_matrix, tie_breaker, block,
+                              head_to_head_tables))
+        blocks = refined_blocks
 
-        if num_ties_after_breaking == 0:
-            break
         if tie_breaker in OPTIONAL_TIE_BREAKERS:
             # Optional tie breaker can be used more than 1 time!
-            if num_ties_before_breaking > num_ties_after_breaking:
+            if len(blocks) > num_blocks_before_breaking:
                 continue
         tie_breaker_idx += 1
 
+    table[:] = [row for block in blocks for row in block]
+    place = 0
+    for block in blocks:
+        for row in block:
+            row["tie_breakers"]["shared_place"] = place
+        place += len(block)
+
 
-def render_result_table_content(group: Group, do_sort: bool) -> None:
+def render_result_table_content(group_data: GroupData,
+                                do_sort: bool) -> None:
     """
     TODO: stub
     """
-    teams_set = Team.objects.filter(group=group)
-    num_teams = len(teams_set)
-    teams = {
-        item["seed"]: teams_set.get(seed=item["seed"])
-        for item in teams_set.values("seed")
-    }
+    teams = group_data.teams_by_seed
+    num_teams = len(teams)
+
+    games = group_data.games
+    result_matrix = ResultMatrix.from_games(num_teams, games)
+    home_games = collections.defaultdict(list)
+    away_games = collections.defaultdict(list)
+    for game in games:
+        home_games[game.home_team_id].append(game)
+        away_games[game.away_team_id].append(game)
 
     # TODO: add getting of optional tie breakers
     # like "optional_won_between",
@@ -325,9 +363,12 @@ def render_result_table_content(group: Group, do_sort: bool) -> None:
     for seed in range(num_teams):
         team = teams[seed]
         result_table[seed] = get_row(
-            seed, team, group, num_teams)
+            seed, team, num_teams,
+            home_games=home_games[team.id],
+            away_games=away_games[team.id],
+            tie_breakers=count_base_tie_breakers(result_matrix, seed))
     if do_sort:
-        calculate_places(group, result_table)
+        calculate_places(result_matrix, result_table)
         for row in result_table:
             row["place_cell"].content = row["tie_breakers"]["shared_place"] + 1
 
@@ -341,10 +382,11 @@ NUM_RECENT_ROUNDS: int = 2
 RoundSchedule = tp.Tuple[int, tp.List[GameResult]]
 
 
+@timed_stage("schedule")
 def get_upcoming_games_schedule(
-        group: Group) -> tp.List[RoundSchedule]:
+        group_data: GroupData) -> tp.List[RoundSchedule]:
     scheduled_group_games = [
-        gr for gr in GameResult.objects.filter(group=group)
+        gr for gr in group_data.games
         if not gr.is_finished
     ]
     upcoming_rounds_numbers: tp.List[int] = sorted(
@@ -367,10 +409,11 @@ def get_upcoming_games_schedule(
     return upcoming_games_schedule
 
 
+@timed_stage("schedule")
 def get_recent_games_schedule(
-        group: Group) -> tp.List[RoundSchedule]:
+        group_data: GroupData) -> tp.List[RoundSchedule]:
     finished_group_games = [
-        gr for gr in GameResult.objects.filter(group=group)
+        gr for gr in group_data.games
         if gr.is_finished
     ]
     recent_rounds_numbers: tp.List[int] = sorted(
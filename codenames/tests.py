@@ -1,3 +1,1078 @@
-from django.test import TestCase
+"""
+Tests of codenames app.
+"""
 
-# Create your tests here.
+import asyncio
+import copy
+import io
+import random
+import time
+import tracemalloc
+import typing as tp
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import events, models, views
+from .consts import CURRENT_CUP_NUMBER, GROUPS_NUMBER
+from .loader import load_groups
+from .metrics import sql_metrics
+from .backup import BackupError, read_backup, restore_games, write_backup
+from .consts import AWAY_SIDE
+from .models import Arena, Cup, GameResult, Group, Player, ResultType, Team
+from .models import GroupResultsVersion
+from .models import get_result_columns_mismatches
+from .models import result_types_registry, sentinel_ids
+from .models import get_current_cup_id, get_dummy_arena_id
+from .registration import import_teams, read_txt_lines
+from .result_matrix import ResultMatrix
+from .schedule import generate_round_robin
+from . import standings
+from .synthetic import finish_game, generate_cup
+from .table_render import HtmlTableCell, render_table_html
+from .table_render import are_all_games_finished, break_tie
+from .table_render import calculate_places
+from .tiebreak import OPTIONAL_TIE_BREAKERS
+from .tiebreak import TIE_BREAKERS_ORDER, TIE_BREAKERS_WEIGHTS
+from .tiebreak import count_base_tie_breakers, count_teams_base_tie_breakers
+from .tiebreak import count_tie_breaker
+
+# Group sizes to run every view at: number of queries must be the same
+QUERIES_TEAMS_NUMBERS: tp.Tuple[int, ...] = (6, 10)
+
+# Makes request to cup out of counted queries
+RequestMaker = tp.Callable[[Cup], tp.Callable[[], HttpResponse]]
+
+# View -> max number of queries
+# with empty standings cache and result types registry,
+# rendering views lock results versions in savepoint (3 queries)
+QUERIES_BUDGETS: tp.Dict[str, int] = {
+    "start_view": 1,
+    "all_groups_sorted_tables_view": 12,
+    "all_groups_unsorted_tables_view": 12,
+    "one_group_table_view": 12,
+    "add_result_get": 2,
+    "add_result_post": 9,
+}
+
+
+@override_settings(
+    STATICFILES_STORAGE=(
+        "django.contrib.staticfiles.storage.StaticFilesStorage"),
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "codenames-tests",
+        }
+    },
+)
+class ViewsQueriesBudgetsTest(TestCase):
+    """
+    Number of queries of every view must not depend on number of teams
+    and must fit its budget.
+    """
+
+    def get(self, path: str) -> RequestMaker:
+        return lambda cup: lambda: self.client.get(path)
+
+    def count_queries(self, num_teams: int,
+                      make_request: RequestMaker) -> int:
+        """
+        Number of queries of request on full cup
+        with groups of num_teams teams.
+        """
+        with transaction.atomic():
+            cup = generate_cup(CURRENT_CUP_NUMBER,
+                               num_groups=GROUPS_NUMBER,
+                               num_teams=num_teams,
+                               completion=0.5,
+                               seed=num_teams)
+            send_request = make_request(cup)
+            cache.clear()
+            result_types_registry.invalidate()
+            with CaptureQueriesContext(connection) as queries:
+                response = send_request()
+            self.assertEqual(response.status_code, 200)
+            transaction.set_rollback(True)
+        return len(queries)
+
+    def assert_queries_budget(self, view_name: str,
+                              make_request: RequestMaker) -> None:
+        queries_numbers: tp.Dict[int, int] = {
+            num_teams: self.count_queries(num_teams, make_request)
+            for num_teams in QUERIES_TEAMS_NUMBERS
+        }
+        self.assertEqual(
+            len(set(queries_numbers.values())), 1,
+            f"{view_name} queries depend on number of teams: "
+            f"{queries_numbers}")
+        for num_teams, queries_number in queries_numbers.items():
+            self.assertLessEqual(
+                queries_number, QUERIES_BUDGETS[view_name],
+                f"{view_name} with {num_teams} teams in group")
+
+    def test_start_view(self):
+        self.assert_queries_budget(
+            "start_view",
+            # start_view has no url
+            lambda cup: lambda: views.start_view(
+                RequestFactory().get("/")))
+
+    def test_all_groups_sorted_tables_view(self):
+        self.assert_queries_budget(
+            "all_groups_sorted_tables_view",
+            self.get("/results/"))
+
+    def test_all_groups_unsorted_tables_view(self):
+        self.assert_queries_budget(
+            "all_groups_unsorted_tables_view",
+            self.get("/raw/"))
+
+    def test_one_group_table_view(self):
+        self.assert_queries_budget(
+            "one_group_table_view",
+            self.get("/A/"))
+
+    def test_add_result_get(self):
+        self.assert_queries_budget(
+            "add_result_get",
+            self.get("/A/add_result/"))
+
+    def test_add_result_post(self):
+        def post_result(cup: Cup) -> tp.Callable[[], HttpResponse]:
+            game = GameResult.objects.filter(
+                group__cup=cup, group__name="A", result_type=None
+            ).first()
+            result_type = ResultType.objects.get(abbr="W1")
+            return lambda: self.client.post(
+                "/A/add_result/",
+                {
+                    "game": game.id,
+                    "result_type": result_type.id,
+                    "score": 3,
+                    "home_team_fouls": 0,
+                    "away_team_fouls": 1,
+                })
+        self.assert_queries_budget("add_result_post", post_result)
+
+
+class TeamsBaseTieBreakersTest(TestCase):
+    """
+    Base tie breakers counted by db must be the same as by ResultMatrix.
+    """
+
+    def test_same_as_result_matrix(self):
+        for num_teams, completion, tie_heavy in [(5, 0.5, False),
+                                                 (10, 1.0, False),
+                                                 (10, 0.8, True)]:
+            with transaction.atomic():
+                cup = generate_cup(CURRENT_CUP_NUMBER,
+                                   num_groups=GROUPS_NUMBER,
+                                   num_teams=num_teams,
+                                   completion=completion,
+                                   tie_heavy=tie_heavy,
+                                   seed=num_teams)
+                with self.assertNumQueries(1):
+                    teams_tie_breakers = count_teams_base_tie_breakers(
+                        GameResult.objects.filter(group__cup=cup))
+                groups = list(Group.objects.filter(cup=cup, dummy=False))
+                for group_data in load_groups(cup, groups):
+                    result_matrix = ResultMatrix.from_games(
+                        len(group_data.teams), group_data.games)
+                    for team in group_data.teams:
+                        self.assertEqual(
+                            teams_tie_breakers[team.id],
+                            count_base_tie_breakers(result_matrix,
+                                                    team.seed))
+                transaction.set_rollback(True)
+
+
+def reference_count_optional_tie_breaker(result_matrix: ResultMatrix,
+                                         tie_breaker, table, shared_places):
+    """
+    count_optional_tie_breaker before blocks of tied teams,
+    with weight applied once to rows of every tied block.
+    """
+    for row in table:
+        row["tie_breakers"][tie_breaker] = 0
+    for place in set(shared_places):
+        if shared_places.count(place) == 1:
+            continue
+        place_sharing_seeds = {
+            i: row["seed"]
+            for i, row in enumerate(table)
+            if row["tie_breakers"]["shared_place"] == place
+        }
+        tied_seeds = list(place_sharing_seeds.values())
+        if not are_all_games_finished(result_matrix, tied_seeds):
+            continue
+        for idx, seed in place_sharing_seeds.items():
+            table[idx]["tie_breakers"][tie_breaker] = (
+                TIE_BREAKERS_WEIGHTS[tie_breaker] * count_tie_breaker(
+                    result_matrix, tie_breaker, seed, tied_seeds))
+
+
+def reference_calculate_places(result_matrix: ResultMatrix, table):
+    """
+    calculate_places before blocks of tied teams:
+    whole table is sorted by all tie breakers so far at every step.
+    """
+    for row in table:
+        row["tie_breakers"]["shared_place"] = 0
+    num_teams = len(table)
+    tie_breaker_idx = 0
+    while tie_breaker_idx < len(TIE_BREAKERS_ORDER):
+        shared_places = [row["tie_breakers"]["shared_place"] for row in table]
+        num_ties_before_breaking = num_teams - len(set(shared_places))
+        tie_breaker = TIE_BREAKERS_ORDER[tie_breaker_idx]
+        if tie_breaker in OPTIONAL_TIE_BREAKERS:
+            reference_count_optional_tie_breaker(
+                result_matrix, tie_breaker, table, shared_places)
+        tie_breakers = (["shared_place"]
+                        + TIE_BREAKERS_ORDER[:tie_breaker_idx + 1])
+
+        def tie_break_values(row):
+            return [row["tie_breakers"][tb] for tb in tie_breakers]
+
+        table.sort(key=tie_break_values)
+        new_shared_places = [0] * num_teams
+        for place in range(1, num_teams):
+            if (tie_break_values(table[place - 1])
+                    == tie_break_values(table[place])):
+                new_shared_places[place] = new_shared_places[place - 1]
+            else:
+                new_shared_places[place] = place
+        for place in range(num_teams):
+            table[place]["tie_breakers"]["shared_place"] = (
+                new_shared_places[place])
+        num_ties_after_breaking = num_teams - len(set(new_shared_places))
+        if num_ties_after_breaking == 0:
+            break
+        if (tie_breaker in OPTIONAL_TIE_BREAKERS
+                and num_ties_before_breaking > num_ties_after_breaking):
+            continue
+        tie_breaker_idx += 1
+
+
+def get_ranking_table(result_matrix: ResultMatrix) -> tp.List[tp.Dict]:
+    """
+    Rows with weighted base tie breakers like in table rendering.
+    """
+    return [
+        {
+            "seed": seed,
+            "tie_breakers": {
+                tb: TIE_BREAKERS_WEIGHTS[tb] * value
+                for tb, value in count_base_tie_breakers(
+                    result_matrix, seed).items()
+            },
+        }
+        for seed in range(result_matrix.num_teams)
+    ]
+
+
+def get_places(table) -> tp.List[tp.Tuple[int, int]]:
+    """
+    [(seed, shared place)] of sorted table.
+    """
+    return [(row["seed"], row["tie_breakers"]["shared_place"])
+            for row in table]
+
+
+class RankingTest(TestCase):
+    """
+    Places must be the same as by the whole table sorting
+    (with head-to-head weights fixed).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("add_resulttypes", stdout=io.StringIO())
+
+    def setUp(self):
+        self.result_types: tp.Dict[str, ResultType] = {
+            result_type.abbr: result_type
+            for result_type in result_types_registry.all()
+        }
+
+    def make_game(self, abbr: str, score: int = 1, *,
+                  home_team_fouls: int = 0,
+                  away_team_fouls: int = 0) -> GameResult:
+        # Ids are given, so dummy defaults are not queried
+        return GameResult(group_id=0, home_team_id=0, away_team_id=0,
+                          arena_id=0, round_number=0,
+                          result_type=self.result_types[abbr],
+                          score=score,
+                          home_team_fouls=home_team_fouls,
+                          away_team_fouls=away_team_fouls)
+
+    def get_matrix(self, num_teams: int,
+                   wins: tp.List[tp.Tuple[int, int]]) -> ResultMatrix:
+        """
+        Matrix of 1-word home wins without fouls: (winner, loser).
+        """
+        result_matrix = ResultMatrix(num_teams)
+        for winner, loser in wins:
+            result_matrix.add_game(winner, loser, self.make_game("W1"))
+        return result_matrix
+
+    def test_result_matrix(self):
+        result_matrix = ResultMatrix(3)
+        result_matrix.add_game(0, 1, self.make_game(
+            "W1", 3, home_team_fouls=1, away_team_fouls=2))
+        absence = self.result_types["A1"]
+        result_matrix.add_game(2, 0, self.make_game("A1", 0))
+        winner, loser = (2, 0) if absence.is_home_win else (0, 2)
+
+        stats = result_matrix.stats
+        self.assertEqual(stats["won"][0][1], 1)
+        self.assertEqual(stats["won"][1][0], 0)
+        self.assertEqual(stats["fouls"][0][1], 1)
+        self.assertEqual(stats["fouls"][1][0], 2)
+        self.assertEqual(stats["words_difference"][0][1], 3)
+        self.assertEqual(stats["words_difference"][1][0], -3)
+        self.assertEqual(stats["won"][winner][loser], 1)
+        self.assertEqual(stats["absences"][loser][winner], 1)
+        # Winner of auto result gets no words, loser loses auto score
+        self.assertEqual(stats["words_difference"][winner][loser], 0)
+        self.assertEqual(stats["words_difference"][loser][winner],
+                         -abs(absence.home_auto_score))
+        self.assertEqual(result_matrix.row_sum("games_played", 0), 2)
+        self.assertEqual(result_matrix.row_sum("games_played", 0, [1]), 1)
+        self.assertEqual(result_matrix.count_finished_games([0, 1, 2]), 2)
+
+        copied = result_matrix.copy()
+        copied.add_game(1, 2, self.make_game("W1"))
+        self.assertEqual(result_matrix.count_finished_games([0, 1, 2]), 2)
+        self.assertEqual(copied.count_finished_games([0, 1, 2]), 3)
+
+    def test_break_tie(self):
+        # 0, 1 and 2 beat each other in circle, 0 and 1 beat 3
+        result_matrix = self.get_matrix(4, [(0, 1), (1, 2), (2, 0),
+                                            (0, 3), (1, 3)])
+        rows = get_ranking_table(result_matrix)
+        head_to_head_tables = {}
+        self.assertEqual(
+            [[row["seed"] for row in block] for block in break_tie(
+                result_matrix, "won", rows, head_to_head_tables)],
+            [[0, 1], [2], [3]])
+        # 1 beat 2, but 2 hasn't played with 3 yet
+        self.assertEqual(
+            [[row["seed"] for row in block] for block in break_tie(
+                result_matrix, "optional_won_between", rows[1:],
+                head_to_head_tables)],
+            [[1, 2, 3]])
+        self.assertEqual(
+            [[row["seed"] for row in block] for block in break_tie(
+                result_matrix, "optional_won_between", rows[:2],
+                head_to_head_tables)],
+            [[0], [1]])
+        self.assertEqual(set(head_to_head_tables),
+                         {frozenset([1, 2, 3]), frozenset([0, 1])})
+        self.assertIsNone(head_to_head_tables[frozenset([1, 2, 3])])
+
+    def test_two_tied_blocks(self):
+        # 0 and 3 have 2 wins each and 3 beat 0,
+        # 1 and 2 have 1 win each and 1 beat 2
+        result_matrix = self.get_matrix(4, [(3, 0), (0, 1), (0, 2),
+                                            (3, 1), (2, 3), (1, 2)])
+        table = get_ranking_table(result_matrix)
+        calculate_places(result_matrix, table)
+        self.assertEqual(get_places(table),
+                         [(3, 0), (0, 1), (1, 2), (2, 3)])
+
+    def test_same_as_reference(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            num_teams = rng.randint(2, 10)
+            completion = rng.random()
+            tie_heavy = rng.random() < 0.5
+            result_matrix = ResultMatrix(num_teams)
+            for home_seed in range(num_teams):
+                for away_seed in range(home_seed + 1, num_teams):
+                    if rng.random() > completion:
+                        continue
+                    game = self.make_game("W1")
+                    finish_game(game, rng, self.result_types, tie_heavy)
+                    result_matrix.add_game(home_seed, away_seed, game)
+            table = get_ranking_table(result_matrix)
+            reference_table = copy.deepcopy(table)
+            calculate_places(result_matrix, table)
+            reference_calculate_places(result_matrix, reference_table)
+            self.assertEqual(get_places(table),
+                             get_places(reference_table))
+
+
+@override_settings(
+    STATICFILES_STORAGE=(
+        "django.contrib.staticfiles.storage.StaticFilesStorage"),
+)
+class GameResultColumnsTest(TestCase):
+    """
+    Derived result columns must follow result type and score.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cup = generate_cup(CURRENT_CUP_NUMBER,
+                               num_groups=1,
+                               num_teams=4,
+                               completion=0.5)
+
+    def test_generated_games_are_consistent(self):
+        self.assertEqual(
+            get_result_columns_mismatches(GameResult.objects.all()), [])
+
+    def test_save(self):
+        game = GameResult.objects.filter(result_type=None).first()
+        game.result_type = ResultType.objects.get(abbr="B2")
+        game.save()
+        game.refresh_from_db()
+        self.assertEqual(
+            (game.winner_side, game.effective_score,
+             game.finished, game.result_abbr),
+            (AWAY_SIDE, game.home_score, True, "B2"))
+
+    def test_add_and_delete_result(self):
+        game = GameResult.objects.filter(result_type=None).first()
+        self.client.post("/A/add_result/", {
+            "game": game.id,
+            "result_type": ResultType.objects.get(abbr="W2").id,
+            "score": 3,
+            "home_team_fouls": 0,
+            "away_team_fouls": 0,
+        })
+        game.refresh_from_db()
+        self.assertEqual(
+            (game.winner_side, game.effective_score,
+             game.finished, game.result_abbr),
+            (AWAY_SIDE, -3, True, "W2"))
+
+        self.client.post("/A/add_result/", {
+            "game": game.id,
+            "result_type": ResultType.objects.get(abbr="DE").id,
+            "score": 0,
+            "home_team_fouls": 0,
+            "away_team_fouls": 0,
+        })
+        game.refresh_from_db()
+        self.assertFalse(game.finished)
+        self.assertEqual(
+            get_result_columns_mismatches(GameResult.objects.all()), [])
+
+    def test_change_result_type(self):
+        result_type = GameResult.objects.filter(
+            result_type__is_auto=False).first().result_type
+        result_type.is_home_win = not result_type.is_home_win
+        result_type.save()
+        self.assertEqual(
+            get_result_columns_mismatches(GameResult.objects.all()), [])
+
+        result_type.is_auto = True
+        result_type._auto_score = 3
+        result_type.save()
+        self.assertEqual(
+            get_result_columns_mismatches(GameResult.objects.all()), [])
+
+        result_type.do_delete = True
+        result_type.save()
+        self.assertEqual(
+            get_result_columns_mismatches(GameResult.objects.all()), [])
+
+
+class SentinelIdsTest(TestCase):
+    """
+    Ids of dummy defaults are memoized only for committed objects.
+    """
+
+    def setUp(self):
+        sentinel_ids.clear()
+
+    def test_committed_sentinel_is_memoized(self):
+        # Current cup is created by migrations
+        cup_id = get_current_cup_id()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_current_cup_id(), cup_id)
+
+    def test_rolled_back_sentinel_is_not_memoized(self):
+        with transaction.atomic():
+            get_dummy_arena_id()
+            transaction.set_rollback(True)
+        self.assertTrue(Arena.objects.filter(id=get_dummy_arena_id(),
+                                             dummy=True).exists())
+
+
+class ResultTypeRegistryTest(TestCase):
+    """
+    Result types changed by other processes are refetched after timeout.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("add_resulttypes", stdout=io.StringIO())
+
+    def setUp(self):
+        result_types_registry.invalidate()
+        # Don't leak result types updated without signals to other tests
+        self.addCleanup(result_types_registry.invalidate)
+
+    def test_timeout(self):
+        fingerprint = result_types_registry.fingerprint
+        # Update without signals, as if it were done by other process
+        ResultType.objects.filter(abbr="W1").update(_description="Win")
+        with self.assertNumQueries(0):
+            self.assertNotEqual(
+                result_types_registry.get_by_abbr("W1").description, "Win")
+        with mock.patch.object(
+                models.time, "monotonic",
+                return_value=(time.monotonic()
+                              + models.RESULT_TYPES_REGISTRY_TIMEOUT + 1)):
+            self.assertEqual(
+                result_types_registry.get_by_abbr("W1").description, "Win")
+        self.assertEqual(result_types_registry.fingerprint, fingerprint)
+
+        ResultType.objects.filter(abbr="W1").update(is_auto=True)
+        result_types_registry.invalidate()
+        self.assertNotEqual(result_types_registry.fingerprint, fingerprint)
+
+
+class RoundRobinScheduleTest(TestCase):
+    """
+    Generated schedule must be a valid round-robin for any group size.
+    """
+
+    def test_every_pair_plays_once_a_round(self):
+        for num_teams in range(2, 21):
+            schedule = generate_round_robin(num_teams)
+            pairs: tp.List[tp.FrozenSet[int]] = []
+            for round_games in schedule:
+                seeds = [seed for game in round_games
+                         for seed in (game["first"], game["second"])]
+                seats = [game["seat"] for game in round_games]
+                self.assertEqual(len(seeds), len(set(seeds)))
+                self.assertEqual(len(seats), len(set(seats)))
+                self.assertLessEqual(max(seats), num_teams // 2)
+                pairs += [frozenset((game["first"], game["second"]))
+                          for game in round_games]
+            self.assertEqual(len(pairs), len(set(pairs)))
+            self.assertEqual(len(pairs), num_teams * (num_teams - 1) // 2)
+
+    def test_upsert_matches_swapped_pairs(self):
+        generate_cup(CURRENT_CUP_NUMBER,
+                     num_groups=1,
+                     num_teams=6,
+                     completion=0)
+        games = GameResult.objects.filter(group__name="A")
+        num_games = games.count()
+        # Group was scheduled with home and away swapped
+        for game in games.all():
+            game.home_team, game.away_team = game.away_team, game.home_team
+            game.save()
+        games.first().delete()
+        call_command("add_gameresults", "-g", "A", "-n", "6", "-u",
+                     stdout=io.StringIO())
+        self.assertEqual(games.count(), num_games)
+
+
+class RegistrationImportTest(TestCase):
+    """
+    Import of teams makes the same number of queries for any list size
+    and never duplicates players and teams.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cup = generate_cup(CURRENT_CUP_NUMBER,
+                               num_groups=1,
+                               num_teams=4,
+                               completion=0)
+        cls.group = Group.objects.get(cup=cls.cup, name="A")
+
+    def import_lines(self, lines: tp.List[str], *,
+                     assign_seeds: bool = False, **kwargs):
+        return import_teams(read_txt_lines(io.StringIO("\n".join(lines))),
+                            cup=self.cup,
+                            group=self.group,
+                            assign_seeds=assign_seeds,
+                            first_name_first=False,
+                            **kwargs)
+
+    def test_queries_do_not_depend_on_size(self):
+        queries_numbers: tp.List[int] = []
+        for num_teams in (4, 40):
+            with transaction.atomic():
+                lines = [f"Player{seed}a Team - Player{seed}b Team"
+                         for seed in range(num_teams)]
+                with CaptureQueriesContext(connection) as queries:
+                    report = self.import_lines(lines)
+                self.assertEqual(len(report.new_teams), num_teams)
+                queries_numbers.append(len(queries))
+                transaction.set_rollback(True)
+        self.assertEqual(queries_numbers[0], queries_numbers[1])
+
+    def test_existing_players_and_teams(self):
+        team = Team.objects.filter(group=self.group).first()
+        existing_line = (
+            f"{team.second_player.first_name} {team.second_player.last_name}"
+            f" - "
+            f"{team.first_player.first_name} {team.first_player.last_name}")
+        new_line = (f"{team.first_player.first_name} "
+                    f"{team.first_player.last_name} - New Player")
+        num_players = Player.objects.count()
+
+        lines = [existing_line, new_line, new_line, existing_line]
+        report = self.import_lines(lines, dry_run=True)
+        self.assertEqual(len(report.new_players), 1)
+        self.assertEqual(len(report.new_teams), 1)
+        self.assertEqual(len(report.changed_teams), 1)
+        self.assertEqual(report.duplicate_lines, [3, 4])
+        self.assertEqual(Player.objects.count(), num_players)
+
+        self.import_lines(lines)
+        self.assertEqual(Player.objects.count(), num_players + 1)
+        self.assertEqual(
+            Team.objects.filter(cup=self.cup, group=self.group).count(), 5)
+
+    def get_team_lines(self) -> tp.List[str]:
+        return [
+            f"{team.first_player.first_name} {team.first_player.last_name}"
+            f" - "
+            f"{team.second_player.first_name} {team.second_player.last_name}"
+            for team in Team.objects.filter(group=self.group).order_by(
+                "seed").select_related("first_player", "second_player")
+        ]
+
+    def get_seeds(self) -> tp.Dict[str, tp.Optional[int]]:
+        return dict(Team.objects.filter(group=self.group).values_list(
+            "first_player__last_name", "seed"))
+
+    def test_reorder_seeds(self):
+        lines = self.get_team_lines()
+        seeds = self.get_seeds()
+        self.import_lines(lines[::-1], assign_seeds=True)
+        self.assertEqual(
+            self.get_seeds(),
+            {last_name: len(lines) - 1 - seed
+             for last_name, seed in seeds.items()})
+
+    def test_withdrawn_team(self):
+        lines = self.get_team_lines()
+        seeds = self.get_seeds()
+        report = self.import_lines(lines[:1] + lines[2:], assign_seeds=True)
+        self.assertEqual(len(report.changed_teams), len(lines) - 1)
+        self.assertEqual(
+            self.get_seeds(),
+            {last_name: (seed if seed < 1 else
+                         None if seed == 1 else
+                         seed - 1)
+             for last_name, seed in seeds.items()})
+
+
+class GameResultsBackupTest(TestCase):
+    """
+    Restored backup gives the same games in every format.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cup = generate_cup(CURRENT_CUP_NUMBER,
+                               num_groups=2,
+                               num_teams=6,
+                               completion=0.5)
+
+    def get_backup(self, games, backup_format: str) -> str:
+        backup = io.StringIO()
+        write_backup(games, backup, backup_format=backup_format,
+                     chunk_size=7)
+        return backup.getvalue()
+
+    def test_restore(self):
+        games = GameResult.objects.filter(group__cup=self.cup)
+        for backup_format in ("jsonl", "csv"):
+            backup = self.get_backup(games, backup_format)
+            games.update(score=0, result_type=None, round_number=0,
+                         home_team_fouls=0, away_team_fouls=0)
+            restored = restore_games(games,
+                                     read_backup(io.StringIO(backup)),
+                                     batch_size=7)
+            self.assertEqual(restored, (games.count(), 0))
+            self.assertEqual(self.get_backup(games, backup_format), backup)
+            self.assertEqual(get_result_columns_mismatches(games), [])
+
+    def test_restore_group_from_cup_backup(self):
+        cup_games = GameResult.objects.filter(group__cup=self.cup)
+        group_games = cup_games.filter(group__name="A")
+        backup = self.get_backup(cup_games, "jsonl")
+        group_backup = self.get_backup(group_games, "jsonl")
+        cup_games.update(score=0, result_type=None)
+        restored = restore_games(group_games,
+                                 read_backup(io.StringIO(backup)),
+                                 batch_size=7)
+        self.assertEqual(restored, (group_games.count(),
+                                    cup_games.count() - group_games.count()))
+        self.assertEqual(self.get_backup(group_games, "jsonl"), group_backup)
+        self.assertFalse(cup_games.filter(group__name="B")
+                         .exclude(result_type=None).exists())
+
+    def test_restore_other_teams(self):
+        games = GameResult.objects.filter(group__name="A")
+        backup = self.get_backup(games, "jsonl")
+        game = games.first()
+        game.home_team, game.away_team = game.away_team, game.home_team
+        game.save()
+        with self.assertRaises(BackupError):
+            restore_games(games, read_backup(io.StringIO(backup)))
+
+    def test_malformed_backup(self):
+        header = self.get_backup(GameResult.objects.none(), "jsonl")
+        for backup in ["", "{", "[1]\n",
+                       '{"model": "codenames.gameresult"}\n',
+                       "codenames.gameresult,1\n",
+                       "codenames.gameresult\n",
+                       header + "[1, 2]\n",
+                       header + "{\n"]:
+            with self.assertRaises(BackupError, msg=backup):
+                list(read_backup(io.StringIO(backup)))
+
+    def test_backup_from_result_type(self):
+        games = GameResult.objects.filter(group__cup=self.cup)
+        backup = self.get_backup(games, "csv")
+        # Derived column drifted from result type
+        games.exclude(result_type=None).update(result_abbr="XX")
+        self.assertEqual(self.get_backup(games, "csv"), backup)
+
+
+@override_settings(
+    STATICFILES_STORAGE=(
+        "django.contrib.staticfiles.storage.StaticFilesStorage"),
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "codenames-tests",
+        }
+    },
+)
+class ServerTimingTest(TestCase):
+    """
+    Stages of standings are reported only if SERVER_TIMING is on.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_cup(CURRENT_CUP_NUMBER,
+                     num_groups=2,
+                     num_teams=6,
+                     completion=0.5)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING=True)
+    def test_stages(self):
+        with self.assertLogs("codenames.timing", "INFO"):
+            response = self.client.get("/results/")
+        metrics = [metric.split(";")[0]
+                   for metric in response["Server-Timing"].split(", ")]
+        for name in ("load", "tie_breakers", "rows", "places", "reorder",
+                     "schedule", "render", "cache", "db", "total"):
+            self.assertIn(name, metrics)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        response = self.client.get("/results/")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+@override_settings(
+    STATICFILES_STORAGE=(
+        "django.contrib.staticfiles.storage.StaticFilesStorage"),
+)
+class ProfilingTest(TestCase):
+    """
+    Only staff users get profile reports instead of pages.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_cup(CURRENT_CUP_NUMBER,
+                     num_groups=1,
+                     num_teams=4,
+                     completion=0.5)
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.user = User.objects.create_user("user")
+
+    def test_staff_reports(self):
+        self.client.force_login(self.staff)
+        for path, expected in [("/results/?profile=cpu", "function calls"),
+                               ("/A/?profile=memory&top=5", "Peak"),
+                               ("/A/add_result/?profile=cpu", "cumulative")]:
+            response = self.client.get(path)
+            self.assertEqual(response["Content-Type"],
+                             "text/plain; charset=utf-8")
+            self.assertIn(expected, response.content.decode())
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_memory_view_error(self):
+        self.client.force_login(self.staff)
+        with mock.patch.object(views, "get_groups_standings",
+                               side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.get("/A/?profile=memory")
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_not_staff(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/results/?profile=cpu")
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+
+
+@override_settings(
+    STATICFILES_STORAGE=(
+        "django.contrib.staticfiles.storage.StaticFilesStorage"),
+    SQL_METRICS=True,
+    SQL_METRICS_SLOW_REQUEST_MS=0,
+)
+class SQLMetricsTest(TestCase):
+    """
+    Queries of views are exposed in Prometheus format.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_cup(CURRENT_CUP_NUMBER,
+                     num_groups=1,
+                     num_teams=4,
+                     completion=0.5)
+
+    def setUp(self):
+        sql_metrics.reset()
+
+    def test_metrics(self):
+        with self.assertLogs("codenames.metrics", "WARNING"):
+            self.client.get("/A/")
+        self.client.force_login(
+            User.objects.create_user("staff", is_staff=True))
+        metrics = self.client.get("/metrics/").content.decode()
+        self.assertIn('codenames_view_sql_queries_count'
+                      '{view="codenames:one_group_table"} 1', metrics)
+        self.assertIn("codenames_sql_slowest_statement_seconds{", metrics)
+
+    @override_settings(SQL_METRICS_TOKEN="secret")
+    def test_access(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        self.assertEqual(
+            self.client.get("/metrics/",
+                            HTTP_AUTHORIZATION="Bearer wrong").status_code,
+            403)
+        self.assertEqual(
+            self.client.get("/metrics/",
+                            HTTP_AUTHORIZATION="Bearer secret").status_code,
+            200)
+        self.client.force_login(User.objects.create_user("user"))
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+
+    @override_settings(SQL_METRICS=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 404)
+
+
+class TableHtmlTest(TestCase):
+    """
+    Table is rendered with escaped cells.
+    """
+
+    def test_render(self):
+        header = [HtmlTableCell(class_="team_header", content="Team")]
+        table = [[HtmlTableCell(classes=["gameresult_cell", "auto_win"],
+                                content="<b>", title='"x"')]]
+        self.assertEqual(
+            render_table_html(header, table),
+            '<table><tr><th class="team_header"><div>Team</div></th></tr>'
+            '<tr><td class="gameresult_cell auto_win">'
+            '<div title="&quot;x&quot;">&lt;b&gt;</div></td></tr></table>')
+
+
+@override_settings(
+    STATICFILES_STORAGE=(
+        "django.contrib.staticfiles.storage.StaticFilesStorage"),
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "codenames-tests",
+        }
+    },
+)
+class StandingsFragmentsTest(TestCase):
+    """
+    Only groups with new results are rendered again.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_cup(CURRENT_CUP_NUMBER,
+                     num_groups=3,
+                     num_teams=4,
+                     completion=0.5)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_rendered_groups(self, path: str) -> tp.List[str]:
+        with mock.patch.object(
+                standings, "render_group_standings",
+                wraps=standings.render_group_standings) as render:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return [call.args[0].name for call in render.call_args_list]
+
+    def test_only_changed_group_is_rendered(self):
+        for path in ("/results/", "/raw/"):
+            self.assertEqual(self.get_rendered_groups(path),
+                             ["A", "B", "C"])
+            self.assertEqual(self.get_rendered_groups(path), [])
+        game = GameResult.objects.filter(group__name="B",
+                                         result_type=None).first()
+        game.result_type = ResultType.objects.get(abbr="W1")
+        game.score = 2
+        game.save()
+        for path in ("/results/", "/raw/"):
+            self.assertEqual(self.get_rendered_groups(path), ["B"])
+
+    def test_renamed_group(self):
+        self.get_rendered_groups("/results/")
+        Group.objects.filter(name="C").update(name="D")
+        self.assertEqual(self.get_rendered_groups("/results/"), ["D"])
+
+    def test_not_modified(self):
+        for path in ("/results/", "/A/"):
+            etag = self.client.get(path)["ETag"]
+            with self.assertNumQueries(1):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_moved_team_and_result_type(self):
+        # Team without games is moved
+        GameResult.objects.filter(group__name="A").delete()
+        cache.clear()
+        self.get_rendered_groups("/results/")
+        team = Team.objects.filter(group__name="A").order_by("seed").last()
+        team.group = Group.objects.get(cup=team.cup, name="C")
+        team.seed = 4
+        team.save()
+        self.assertEqual(self.get_rendered_groups("/results/"), ["A", "C"])
+
+        result_type = GameResult.objects.filter(
+            group__name="B").exclude(result_type=None).first().result_type
+        result_type.save()
+        self.assertIn("B", self.get_rendered_groups("/results/"))
+
+    def test_single_flight(self):
+        cup = Cup.objects.get(number=CURRENT_CUP_NUMBER)
+        groups = list(Group.objects.filter(cup=cup, dummy=False)
+                      .select_related("results_version").order_by("name"))
+        cache_key = standings.get_standings_cache_key(cup, groups[0], True)
+
+        def lock_results_versions(locked_groups):
+            self.assertEqual(locked_groups, groups)
+            # Another request has rendered group A while this one waited
+            cache.set(cache_key, "A standings")
+
+        with mock.patch.object(
+                standings, "lock_results_versions",
+                side_effect=lock_results_versions), \
+                mock.patch.object(
+                    standings, "render_group_standings",
+                    wraps=standings.render_group_standings) as render:
+            groups_standings = standings.get_groups_standings(
+                cup, groups, do_sort=True)
+        self.assertEqual(groups_standings["A"], "A standings")
+        self.assertEqual([call.args[0].name for call in render.call_args_list],
+                         ["B", "C"])
+
+    def test_lock_creates_results_versions(self):
+        cup = Cup.objects.get(number=CURRENT_CUP_NUMBER)
+        GroupResultsVersion.objects.filter(group__cup=cup).delete()
+        groups = list(Group.objects.filter(cup=cup, dummy=False)
+                      .select_related("results_version"))
+        standings.get_groups_standings(cup, groups, do_sort=True)
+        self.assertEqual(
+            GroupResultsVersion.objects.filter(group__cup=cup).count(),
+            len(groups))
+
+
+class ResultsEventsTest(TestCase):
+    """
+    Connections share one poller of results versions
+    and query database only when their groups change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cup = generate_cup(CURRENT_CUP_NUMBER,
+                               num_groups=2,
+                               num_teams=4,
+                               completion=0.5)
+
+    def finish_game(self) -> None:
+        game = GameResult.objects.filter(group__name="B",
+                                         result_type=None).first()
+        game.result_type = ResultType.objects.get(abbr="W1")
+        game.score = 2
+        game.save()
+
+    async def stream(self, query: str, num_connections: int
+                     ) -> tp.List[str]:
+        disconnect = asyncio.Event()
+        outputs: tp.List[tp.List[str]] = [[] for _ in range(num_connections)]
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        def get_send(output: tp.List[str]):
+            async def send(message):
+                output.append(message.get("body", b"").decode())
+            return send
+
+        scope = {"type": "http", "headers": [],
+                 "query_string": query.encode()}
+        connections = [
+            asyncio.ensure_future(events.results_events_application(
+                scope, receive, get_send(output)))
+            for output in outputs
+        ]
+        await asyncio.sleep(0.1)
+        await sync_to_async(self.finish_game)()
+        await asyncio.sleep(0.1)
+        disconnect.set()
+        await asyncio.gather(*connections)
+        return ["".join(output) for output in outputs]
+
+    @mock.patch.object(events, "RESULTS_EVENTS_POLL_INTERVAL", 0.01)
+    @mock.patch.object(events, "close_old_connections")
+    def test_shared_poller(self, _):
+        groups = list(Group.objects.filter(cup=self.cup, dummy=False)
+                      .select_related("results_version"))
+        versions = events.format_versions(events.get_groups_versions(groups))
+        query = f"cup={CURRENT_CUP_NUMBER}&versions={versions}"
+        with mock.patch.object(
+                events, "collect_results_events",
+                wraps=events.collect_results_events) as collect, \
+                mock.patch.object(
+                    events, "read_cups_versions",
+                    wraps=events.read_cups_versions) as read:
+            outputs = async_to_sync(self.stream)(query, 3)
+        for output in outputs:
+            self.assertEqual(output.count("event: group"), 1)
+            self.assertIn('"group": "B"', output)
+        # Catch up and one change for every connection
+        self.assertEqual(collect.call_count, 6)
+        # One read per interval for all connections
+        self.assertLessEqual(read.call_count, 0.2 / 0.01 + 5)
+        self.assertEqual(events.results_versions_poller.subscribers, {})
@@ -3,10 +3,13 @@ Functions for calculating tiebreak values
 """
 import typing as tp
 
-from django.db.models import Sum
-from django.db.models.functions import Coalesce
+from django.db import models
+from django.db.models.functions import Abs
 
-from .models import ResultType
+from .models import GameResult, ResultType
+from .models import result_types_registry
+from .result_matrix import LOSER_RESULT_TYPES_STATS, ResultMatrix
+from .timing import timed_stage
 
 # Order and weight of tie breakers in group
 # Start tie breaker name with "optional"
@@ -48,102 +51,131 @@ OPTIONAL_TIE_BREAKERS = {
 }
 
 
-def count_game_results(home_games,
-                       away_games) -> tp.Tuple[int, int]:
+TieBreakers = tp.Dict[str, int]
+
+# Tie breakers that do not depend on other tied teams
+BASE_TIE_BREAKERS = [
+    tb for tb in TIE_BREAKERS_ORDER if tb not in OPTIONAL_TIE_BREAKERS
+]
+
+
+# Result matrix stat that every tie breaker sums up:
+# over all rivals for base tie breakers,
+# over tied rivals for optional tie breakers
+TIE_BREAKERS_STATS = {
+    "won": "won",
+    "games_played": "games_played",
+    "absences": "absences",
+    "serious_fouls": "serious_fouls",
+    "fouls": "fouls",
+    "black_loses": "black_loses",
+    "words_difference": "words_difference",
+
+    "optional_won_between": "won",
+    "optional_black_loses_between": "black_loses",
+    "optional_words_difference_between": "words_difference",
+}
+
+
+def count_tie_breaker(result_matrix: ResultMatrix,
+                      tie_breaker: str,
+                      seed: int,
+                      rivals_seeds: tp.Optional[tp.Iterable[int]] = None
+                      ) -> int:
     """
-    :return: Tuple (won_count, lost_count)
+    Unweighted value of tie breaker of team
+    in games against rivals (all by default).
     """
-    home_win_result_types = ResultType.objects.filter(is_home_win=True)
-    away_win_result_types = ResultType.objects.filter(is_home_win=False)
-
-    home_wins = home_games.filter(
-        result_type__in=home_win_result_types)
-    away_wins = away_games.filter(
-        result_type__in=away_win_result_types)
-    home_loses = home_games.filter(
-        result_type__in=away_win_result_types)
-    away_loses = away_games.filter(
-        result_type__in=home_win_result_types)
-
-    return (home_wins.count() + away_wins.count(),
-            home_loses.count() + away_loses.count())
-
-
-def count_won(home_games, away_games):
-    return count_game_results(home_games, away_games)[0]
-
-
-def count_games_played(home_games, away_games):
-    games_won, games_lost = count_game_results(home_games, away_games)
-    return games_won + games_lost
-
-
-def count_absences(home_games, away_games):
-    return (
-        home_games.filter(result_type__abbr="A2").count()
-        + away_games.filter(result_type__abbr="A1").count()
-    )
-
-
-def count_serious_fouls(home_games, away_games):
-    return (
-        home_games.filter(result_type__abbr="F2").count()
-        + away_games.filter(result_type__abbr="F1").count()
-    )
-
-
-def count_fouls(home_finished_games, away_finished_games) -> int:
-    home_fouls: int = home_finished_games.aggregate(
-        fouls=Coalesce(Sum("home_team_fouls"), 0)
-    )["fouls"]
-    away_fouls: int = away_finished_games.aggregate(
-        fouls=Coalesce(Sum("away_team_fouls"), 0)
-    )["fouls"]
-
-    return home_fouls + away_fouls
-
-
-def count_black_loses(home_games, away_games):
-    return (
-        home_games.filter(result_type__abbr="B2").count()
-        + away_games.filter(result_type__abbr="B1").count()
-    )
-
-
-def count_words_difference(home_games, away_games):
-    words_difference: int = 0
-    for game in home_games:
-        if not game.is_finished:
-            continue
-        if game.result_type.is_home_win:
-            if not game.result_type.is_auto:
-                words_difference += game.absolute_score
-        else:
-            words_difference -= game.absolute_score
-    for game in away_games:
-        if not game.is_finished:
-            continue
-        if not game.result_type.is_home_win:
-            if not game.result_type.is_auto:
-                words_difference += game.absolute_score
-        else:
-            words_difference -= game.absolute_score
-
-    return words_difference
-
-
-# functions to calculate optional tie breakers
-# that get (home_games, away_games)
-tie_breaker_calculators = {
-    "won": count_won,
-    "games_played": count_games_played,
-    "absences": count_absences,
-    "serious_fouls": count_serious_fouls,
-    "fouls": count_fouls,
-    "black_loses": count_black_loses,
-    "words_difference": count_words_difference,
-
-    "optional_won_between": count_won,
-    "optional_black_loses_between": count_black_loses,
-    "optional_words_difference_between": count_words_difference,
-}
+    return result_matrix.row_sum(TIE_BREAKERS_STATS[tie_breaker],
+                                 seed,
+                                 rivals_seeds)
+
+
+@timed_stage("tie_breakers")
+def count_base_tie_breakers(result_matrix: ResultMatrix,
+                            seed: int) -> TieBreakers:
+    return {
+        tb: count_tie_breaker(result_matrix, tb, seed)
+        for tb in BASE_TIE_BREAKERS
+    }
+
+
+def get_side_base_tie_breakers_aggregates(
+        is_home: bool) -> tp.Dict[str, models.Aggregate]:
+    """
+    Conditional aggregates of base tie breakers of home or away teams
+    over GameResult, same as in ResultMatrix.
+    Result types are taken from registry, so ResultType isn't joined.
+    """
+    result_types: tp.List[ResultType] = result_types_registry.all()
+
+    def result_type_in(condition: tp.Callable[[ResultType], bool]):
+        return models.Q(result_type__in=[
+            result_type.id for result_type in result_types
+            if condition(result_type)
+        ])
+
+    played = models.Q(result_type__isnull=False)
+    won = result_type_in(lambda rt: rt.is_home_win == is_home)
+    lost = result_type_in(lambda rt: rt.is_home_win != is_home)
+    fouls = "home_team_fouls" if is_home else "away_team_fouls"
+
+    # Winner gets words of normal games, loser loses words of all games
+    words_difference_whens: tp.List[models.When] = [
+        models.When(result_type_in(
+            lambda rt: rt.is_home_win == is_home
+            and not rt.is_auto and not rt.do_delete),
+            then=Abs("score")),
+        models.When(result_type_in(
+            lambda rt: rt.is_home_win != is_home
+            and not rt.is_auto and not rt.do_delete),
+            then=-Abs("score")),
+    ] + [
+        models.When(result_type=result_type.id,
+                    then=models.Value(-abs(result_type.home_auto_score)))
+        for result_type in result_types
+        if (result_type.is_home_win != is_home
+            and result_type.is_auto and not result_type.do_delete)
+    ]
+
+    aggregates: tp.Dict[str, models.Aggregate] = {
+        "games_played": models.Count("id", filter=played),
+        "won": models.Count("id", filter=won),
+        "fouls": models.Sum(fouls),
+        "words_difference": models.Sum(models.Case(
+            *words_difference_whens,
+            default=0,
+            output_field=models.IntegerField(),
+        )),
+    }
+    for stat in dict.fromkeys(LOSER_RESULT_TYPES_STATS.values()):
+        aggregates[stat] = models.Count("id", filter=lost & result_type_in(
+            lambda rt: LOSER_RESULT_TYPES_STATS.get(rt.abbr) == stat))
+    return aggregates
+
+
+def count_teams_base_tie_breakers(
+        games: "models.QuerySet[GameResult]") -> tp.Dict[int, TieBreakers]:
+    """
+    Unweighted base tie breakers of every team in games in one query:
+    home and away sides are grouped by team and united.
+    E.g. GameResult.objects.filter(group__cup=cup) for all groups of cup.
+    Games with teams out of group are skipped like in ResultMatrix.
+    :return: dict {team_id: tie_breakers}, teams without games are missing
+    """
+    games = games.filter(home_team__seed__isnull=False,
+                         away_team__seed__isnull=False).order_by()
+    home_sides = games.values(
+        team_id=models.F("home_team")
+    ).annotate(**get_side_base_tie_breakers_aggregates(is_home=True))
+    away_sides = games.values(
+        team_id=models.F("away_team")
+    ).annotate(**get_side_base_tie_breakers_aggregates(is_home=False))
+
+    teams_tie_breakers: tp.Dict[int, TieBreakers] = {}
+    for side in home_sides.union(away_sides, all=True):
+        tie_breakers = teams_tie_breakers.setdefault(
+            side["team_id"], dict.fromkeys(BASE_TIE_BREAKERS, 0))
+        for tb in BASE_TIE_BREAKERS:
+            tie_breakers[tb] += side[tb] or 0
+    return teams_tie_breakers
@@ -0,0 +1,160 @@
+"""
+Per-request timing of standings stages.
+
+Functions decorated with timed_stage (and code in stage blocks)
+add their wall time and SQL queries to timings of current request.
+ServerTimingMiddleware reports them in Server-Timing header,
+so browser dev tools show which stage is slow, and logs them as JSON.
+
+Timings are collected only if settings.SERVER_TIMING is on:
+otherwise the middleware is not loaded and stages only check
+a context variable.
+"""
+
+import contextlib
+import functools
+import json
+import logging
+import time
+import typing as tp
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class StageTiming:
+    """
+    Total time and queries of all calls of stage in request.
+    Nested stages are counted in both stages.
+    """
+
+    def __init__(self):
+        self.duration: float = 0.0
+        self.calls: int = 0
+        self.queries: int = 0
+
+    def as_dict(self) -> tp.Dict[str, tp.Any]:
+        return {
+            "dur_ms": round(self.duration * 1000, 3),
+            "calls": self.calls,
+            "queries": self.queries,
+        }
+
+
+class RequestTimings:
+    """
+    Timings of stages of one request.
+    """
+
+    def __init__(self):
+        self.stages: tp.Dict[str, StageTiming] = {}
+        self.queries: int = 0
+        self.queries_duration: float = 0.0
+
+    def count_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.queries_duration += time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> tp.Iterator[None]:
+        stage_timing = self.stages.setdefault(name, StageTiming())
+        queries_before: int = self.queries
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage_timing.duration += time.perf_counter() - start
+            stage_timing.calls += 1
+            stage_timing.queries += self.queries - queries_before
+
+    def get_server_timing(self, total_duration: float) -> str:
+        metrics: tp.List[str] = [
+            f'{name};dur={stage_timing.duration * 1000:.3f};'
+            f'desc="{stage_timing.calls} calls, '
+            f'{stage_timing.queries} queries"'
+            for name, stage_timing in self.stages.items()
+        ]
+        metrics.append(f'db;dur={self.queries_duration * 1000:.3f};'
+                       f'desc="{self.queries} queries"')
+        metrics.append(f"total;dur={total_duration * 1000:.3f}")
+        return ", ".join(metrics)
+
+
+_request_timings: ContextVar[tp.Optional[RequestTimings]] = ContextVar(
+    "codenames_request_timings", default=None)
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+def stage(name: str) -> tp.ContextManager[None]:
+    """
+    Time block as stage of current request.
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return _NO_STAGE
+    return timings.stage(name)
+
+
+def timed_stage(name: str):
+    """
+    Time every call of function as stage of current request.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _request_timings.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            with timings.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ServerTimingMiddleware:
+    """
+    Collects stages timings of request into Server-Timing header
+    and "codenames.timing" log.
+    Is used only if settings.SERVER_TIMING is on.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SERVER_TIMING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.count_query):
+                response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        total_duration = time.perf_counter() - start
+
+        response["Server-Timing"] = timings.get_server_timing(total_duration)
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "dur_ms": round(total_duration * 1000, 3),
+            "queries": timings.queries,
+            "db_ms": round(timings.queries_duration * 1000, 3),
+            "stages": {name: stage_timing.as_dict()
+                       for name, stage_timing in timings.stages.items()},
+        }))
+        return response
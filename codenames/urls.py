@@ -31,4 +31,6 @@ urlpatterns = [
          name="all_groups_tables"),
     path("<str:group_name>/add_result/", views.add_result,
          name="add_result"),
+    path("events/", views.results_events_view, name="results_events"),
+    path("metrics/", views.metrics_view, name="metrics"),
 ]
@@ -2,20 +2,29 @@
 Views for codenames app.
 """
 
+import hmac
 import typing as tp
 
-from django.http import Http404
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 from django.template.defaulttags import register
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import condition
 
 from .consts import CURRENT_CUP_NUMBER
+from .events import RESULTS_EVENTS_RETRY, ResultsEventsParams
+from .events import collect_results_events, get_results_events_url
 from .forms import AddResultForm
+from .metrics import sql_metrics
 from .models import Cup, GameResult, Group, ResultType
-from .table_render import render_result_table_content
-from .table_render import render_result_table_header
-from .table_render import get_recent_games_schedule
-from .table_render import get_upcoming_games_schedule
+from .models import bump_results_version, get_result_columns
+from .models import result_types_registry
+from .standings import get_groups_etag, get_groups_last_modified
+from .standings import get_groups_standings
+from .timing import stage
 
 
 NON_EXISTING_CUP_ERROR_MESSAGE = _("There is no such cup")
@@ -41,6 +50,50 @@ def start_view(request):
     return render(request, "codenames/start_page.html", context)
 
 
+def get_versioned_groups(request,
+                         cup_number: int,
+                         **filters) -> tp.List[Group]:
+    """
+    Groups with results versions, fetched once per request
+    for both ETag and Last-Modified.
+    """
+    key = (cup_number, tuple(sorted(filters.items())))
+    if not hasattr(request, "_versioned_groups"):
+        request._versioned_groups = {}
+    if key not in request._versioned_groups:
+        request._versioned_groups[key] = list(
+            Group.objects.filter(cup__number=cup_number, **filters)
+            .select_related("results_version")
+        )
+    return request._versioned_groups[key]
+
+
+# Conditional GET of auto-refreshing pages:
+# answer 304 before computing any standings if no results changed.
+def cup_tables_etag(request, *, cup_number=CURRENT_CUP_NUMBER):
+    groups = get_versioned_groups(request, cup_number, dummy=False)
+    return get_groups_etag(groups) if groups else None
+
+
+def cup_tables_last_modified(request, *, cup_number=CURRENT_CUP_NUMBER):
+    return get_groups_last_modified(
+        get_versioned_groups(request, cup_number, dummy=False))
+
+
+def group_table_etag(request, group_name, *, cup_number=CURRENT_CUP_NUMBER):
+    groups = get_versioned_groups(request, cup_number,
+                                  name=group_name.upper())
+    return get_groups_etag(groups) if groups else None
+
+
+def group_table_last_modified(request, group_name, *,
+                              cup_number=CURRENT_CUP_NUMBER):
+    return get_groups_last_modified(
+        get_versioned_groups(request, cup_number, name=group_name.upper()))
+
+
+@condition(etag_func=cup_tables_etag,
+           last_modified_func=cup_tables_last_modified)
 def all_groups_unsorted_tables_view(request,
                                     *,
                                     cup_number=CURRENT_CUP_NUMBER):
@@ -48,6 +101,9 @@ def all_groups_unsorted_tables_view(request,
                                   cup_number=cup_number,
                                   do_sort=False)
 
+
+@condition(etag_func=cup_tables_etag,
+           last_modified_func=cup_tables_last_modified)
 def all_groups_sorted_tables_view(request,
                                   *,
                                   cup_number=CURRENT_CUP_NUMBER):
@@ -56,7 +112,6 @@ def all_groups_sorted_tables_view(request,
                                   do_sort=True)
 
 
-
 def all_groups_tables_view(request,
                            *,
                            cup_number=CURRENT_CUP_NUMBER,
@@ -68,37 +123,28 @@ def all_groups_tables_view(request,
         cup = Cup.objects.get(number=cup_number)
     except Cup.DoesNotExist as cup_no_exist:
         raise Http404(NON_EXISTING_CUP_ERROR_MESSAGE) from cup_no_exist
-    cup_groups = Group.objects.filter(cup__number=cup_number, dummy=False)
-    group_names: tp.List[str] = sorted(cg.name for cg in cup_groups)
-
-    group_headers = {gn: render_result_table_header(cup_groups.get(name=gn))
-                     for gn in group_names}
-    group_tables = {gn: render_result_table_content(cup_groups.get(name=gn),
-                                                    do_sort)
-                    for gn in group_names}
-
-    upcoming_games_lists = {
-        gn: get_upcoming_games_schedule(cup_groups.get(name=gn))
-        for gn in group_names
-    }
-    recent_games_lists = {
-        gn: get_recent_games_schedule(cup_groups.get(name=gn))
-        for gn in group_names
-    }
+    cup_groups = sorted(
+        Group.objects.filter(cup=cup, dummy=False).select_related(
+            "results_version"),
+        key=lambda cg: cg.name)
+    group_names: tp.List[str] = [cg.name for cg in cup_groups]
+
+    groups_standings = get_groups_standings(cup, cup_groups, do_sort)
 
     context = {
         "cup_number": cup.number,
         "group_names": group_names,
-        "groups_headers": group_headers,
-        "groups_tables": group_tables,
-        "upcoming_games": upcoming_games_lists,
-        "recent_games": recent_games_lists,
+        "groups_standings": groups_standings,
         "path": request.path,
         "update_time": 10,
+        "events_url": get_results_events_url(cup.number, cup_groups, do_sort),
     }
-    return render(request, "codenames/all_groups_tables.html", context)
+    with stage("render"):
+        return render(request, "codenames/all_groups_tables.html", context)
 
 
+@condition(etag_func=group_table_etag,
+           last_modified_func=group_table_last_modified)
 def one_group_table_view(request, group_name, *,
                          cup_number=CURRENT_CUP_NUMBER):
     """
@@ -106,37 +152,87 @@ def one_group_table_view(request, group_name, *,
     """
     group_name = group_name.upper()
     try:
-        Cup.objects.get(number=cup_number)
+        cup = Cup.objects.get(number=cup_number)
     except Cup.DoesNotExist as cup_no_exist:
         raise Http404(NON_EXISTING_CUP_ERROR_MESSAGE) from cup_no_exist
     try:
-        group = Group.objects.get(name=group_name, cup__number=cup_number)
+        group = Group.objects.select_related("results_version").get(
+            name=group_name, cup=cup)
     except Group.DoesNotExist as group_no_exist:
         raise Http404(NON_EXISTING_GROUP_ERROR_MESSAGE) from group_no_exist
 
-    group_header = render_result_table_header(group)
-    group_table = render_result_table_content(group, do_sort=True)
-
-    upcoming_games_list = get_upcoming_games_schedule(group)
-    recent_games_list = get_recent_games_schedule(group)
+    group_standings = get_groups_standings(cup, [group],
+                                           do_sort=True)[group.name]
 
     context = {
         "cup_number": cup_number,
         "group_name": group.name,
-        "group_header": group_header,
-        "group_table": group_table,
-        "upcoming_games": upcoming_games_list,
-        "recent_games": recent_games_list,
+        "group_standings": group_standings,
         "update_time": 10,
+        "events_url": get_results_events_url(cup_number, [group],
+                                             do_sort=True,
+                                             group_names=[group.name]),
     }
-    return render(request, "codenames/one_group_table.html", context)
+    with stage("render"):
+        return render(request, "codenames/one_group_table.html", context)
+
+
+def results_events_view(request):
+    """
+    Server-Sent Events with standings of changed groups.
+    Under ASGI it is streamed by events.results_events_application,
+    here client gets changes at once and reconnects later.
+    """
+    params = ResultsEventsParams(request.GET,
+                                 request.headers.get("Last-Event-ID"))
+    events, _ = collect_results_events(params, params.versions)
+    response = HttpResponse(
+        f"retry: {RESULTS_EVENTS_RETRY}\n\n{events}",
+        content_type="text/event-stream; charset=utf-8")
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def has_metrics_access(request) -> bool:
+    """
+    Metrics show SQL, so only staff users and scrapers
+    with "Authorization: Bearer <settings.SQL_METRICS_TOKEN>" see them.
+    """
+    if request.user.is_staff:
+        return True
+    token: tp.Optional[str] = getattr(settings, "SQL_METRICS_TOKEN", None)
+    if not token:
+        return False
+    return hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+def metrics_view(request):
+    """
+    SQL metrics of views in Prometheus text format.
+    """
+    if not getattr(settings, "SQL_METRICS", False):
+        raise Http404()
+    if not has_metrics_access(request):
+        raise PermissionDenied()
+    return HttpResponse(
+        sql_metrics.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 def get_games_choices(group_name: str):
+    # Everything needed for ordering and str(game) in one query
     games_list = sorted(
         GameResult.objects.filter(
             group__name=group_name,
-            group__cup__number=CURRENT_CUP_NUMBER),
+            group__cup__number=CURRENT_CUP_NUMBER
+        ).select_related(
+            "arena__group",
+            "home_team__first_player",
+            "home_team__second_player",
+            "away_team__first_player",
+            "away_team__second_player",
+        ),
         key=lambda x: (x.is_finished, x.round_number, x.arena.short))
     return [
         (game.id, game) for game in games_list
@@ -151,43 +247,52 @@ def add_result(request, group_name: str):
         if form.is_valid():
             data = request.POST
 
-            result_type = ResultType.objects.get(id=data["result_type"])
-            if result_type.do_delete:
-                game = GameResult.objects.get(id=int(data["game"]))
-                if game.is_finished:
+            with transaction.atomic():
+                result_type = result_types_registry.get(
+                    int(data["result_type"]))
+                bump_results_version(Group.objects.filter(
+                    gameresultgroup__id=int(data["game"])))
+                if result_type.do_delete:
+                    game = GameResult.objects.get(id=int(data["game"]))
+                    if game.is_finished:
+                        GameResult.objects.filter(
+                            id=int(data["game"])
+                        ).update(
+                            result_type=None,
+                            score=0,
+                            home_team_fouls=0,
+                            away_team_fouls=0,
+                            **get_result_columns(None, 0)
+                        )
+                        last_add_result = _("Result deleted successfully!")
+                    else:
+                        last_add_result = _("Game isn't finished yet!")
+                else:
+                    score = int(data["score"])
+                    if result_type.is_away_win:
+                        score *= -1
                     GameResult.objects.filter(id=int(data["game"])).update(
-                        result_type=None,
-                        score=0,
-                        home_team_fouls=0,
-                        away_team_fouls=0
+                        result_type=result_type,
+                        score=score,
+                        home_team_fouls=data["home_team_fouls"],
+                        away_team_fouls=data["away_team_fouls"],
+                        **get_result_columns(result_type, score)
                     )
-                    last_add_result = _("Result deleted successfully!")
-                else:
-                    last_add_result = _("Game isn't finished yet!")
-            else:
-                score = int(data["score"])
-                if result_type.is_away_win:
-                    score *= -1
-                GameResult.objects.filter(id=int(data["game"])).update(
-                    result_type=data["result_type"],
-                    score=score,
-                    home_team_fouls=data["home_team_fouls"],
-                    away_team_fouls=data["away_team_fouls"],
-                )
-                last_add_result = _("Result added successfully!")
+                    last_add_result = _("Result added successfully!")
             form = AddResultForm(games_choices=get_games_choices(group_name))
         else:
             last_add_result = _("Failed to add result!")
     elif request.method == "GET" or form.is_valid():
         form = AddResultForm(games_choices=get_games_choices(group_name))
 
+    result_types: tp.List[ResultType] = result_types_registry.all()
     ids_to_hide_score: tp.List[int] = [
-        rt.id for rt in ResultType.objects.all() if rt.is_auto
+        rt.id for rt in result_types if rt.is_auto
     ]
     ids_to_hide_fouls: tp.List[int] = [
-        rt.id for rt in ResultType.objects.all() if rt.abbr.startswith("A")
+        rt.id for rt in result_types if rt.abbr.startswith("A")
     ] + [
-        rt.id for rt in ResultType.objects.all() if rt.abbr == "DE"
+        rt.id for rt in result_types if rt.abbr == "DE"
     ]
 
     context = {